@@ -1,27 +1,65 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Body
+from fastapi import FastAPI, HTTPException, UploadFile, File, Body, Request, Response, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
-import uvicorn
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, ORJSONResponse, StreamingResponse
 import os
+import asyncio
+import time
 from datetime import datetime
-import shutil
+import hashlib
+import csv
+import io
+import orjson
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, List
+from sqlalchemy import JSON
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 
-from database import engine, Base, Question, Vocabulary, StudyRecord
+from database import (engine, Base, SessionLocal, get_db, Question, Vocabulary, StudyRecord, UserVocabularyState,
+                      DuplicateQuestionError, EXPORT_TABLES, iter_export_batches, init_fulltext_search,
+                      init_change_tracking, get_table_versions, upgrade_schema, ingest_ocr_page, normalize_word,
+                      question_cache, vocabulary_cache)
+import schemas
+import metrics
+import profiling
 from schemas import QuestionCreate, QuestionUpdate, VocabularyCreate, VocabularyUpdate
 from services.ocr_service import OCRService
+from services.upload_service import UploadService, UploadError, UploadLimitMiddleware
 from services.translation_service import TranslationService
 from services.vocabulary_service import VocabularyService
+from services.analytics_service import AnalyticsService
+from services.review_service import ReviewService
+from services.exam_service import ExamService
 
-# 创建数据库表
-Base.metadata.create_all(bind=engine)
+# 创建数据库表（各步骤耗时见 python server.py --profile-startup）
+with profiling.startup_step("create_all"):
+    Base.metadata.create_all(bind=engine)
+with profiling.startup_step("upgrade_schema"):
+    upgrade_schema(engine)
+with profiling.startup_step("init_fulltext_search"):
+    init_fulltext_search(engine)
+with profiling.startup_step("init_change_tracking"):
+    init_change_tracking(engine)
+metrics.instrument_engine(engine)
+profiling.install_profiling(engine)
 
 app = FastAPI(
     title="德国入籍考试学习助手",
     description="一个帮助你学习德国入籍考试的应用",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
+# 请求延迟统计（/metrics）
+app.add_middleware(metrics.MetricsMiddleware)
+# 每个请求的SQL查询统计：N+1警告写入日志，SQL_DEBUG_HEADERS=1 时加上 X-DB-Query-Count / Server-Timing 响应头
+app.add_middleware(profiling.ProfilingMiddleware)
+
+# 响应压缩（小于1KB的响应不压缩）
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
 # 配置CORS
 app.add_middleware(
     CORSMiddleware,
@@ -36,180 +74,600 @@ if not os.path.exists("uploads"):
     os.makedirs("uploads")
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
-# 初始化服务
-ocr_service = OCRService()
-translation_service = TranslationService()
-vocabulary_service = VocabularyService()
+# 初始化服务（OCR模型和翻译客户端在第一次使用时才加载）
+with profiling.startup_step("init_services"):
+    # 识别前把图片长边缩小到 OCR_MAX_SIDE 像素以内
+    ocr_service = OCRService(max_side=int(os.getenv("OCR_MAX_SIDE", "2560")))
+    # 上传图片的大小（字节）和像素数上限
+    upload_service = UploadService(max_bytes=int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024))),
+                                   max_pixels=int(os.getenv("MAX_IMAGE_PIXELS", "50000000")))
+    translation_service = TranslationService()
+    vocabulary_service = VocabularyService()
+    analytics_service = AnalyticsService()
+    exam_service = ExamService()
+    # 复习结果写入模式：sync / group / async（见 ReviewService）
+    review_service = ReviewService(durability=os.getenv("REVIEW_DURABILITY", "group"))
+metrics.track_queue_depth(review_service.pending_count)
+
+# 图片上传接口的请求体在解析multipart之前限制大小
+app.add_middleware(UploadLimitMiddleware, path_prefix="/api/ocr/",
+                   max_bytes=upload_service.max_bytes + UploadService.MULTIPART_OVERHEAD)
+
+@app.on_event("shutdown")
+def flush_pending_reviews():
+    """关闭前写入缓冲中的复习结果"""
+    review_service.close()
+
+def load_known_vocabulary(force: bool = False):
+    """把词汇库中的单词同步到容错查找索引（见 VocabularyService.refresh_known_words）"""
+    with SessionLocal() as db:
+        vocabulary_service.refresh_known_words(db, force=force)
+
+with profiling.startup_step("load_known_vocabulary"):
+    load_known_vocabulary(force=True)
+
+async def refresh_known_vocabulary():
+    """同步其他worker对词汇库单词的修改，最多每 VocabularyService.REFRESH_INTERVAL 秒查询一次"""
+    if vocabulary_service.refresh_due():
+        await run_in_threadpool(load_known_vocabulary)
+
+def parse_fields(fields: str, schema):
+    """解析稀疏字段参数（逗号分隔），始终包含id；未指定时返回None"""
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in schema.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知字段: {', '.join(unknown)}")
+    return ["id"] + [f for f in dict.fromkeys(requested) if f != "id"]
+
+def check_etag(request: Request, response: Response, db, tables, time_dependent: bool = False):
+    """
+    条件GET：根据相关表的变更计数生成强ETag
 
-@app.get("/")
+    客户端的 If-None-Match 仍然有效时直接返回304响应（不执行实际查询），
+    否则把 ETag 和 Cache-Control 写入响应头并返回 None。
+    结果与当前时间有关的接口（如待复习词汇）把时间按分钟计入ETag。
+    读到的变更计数保存在 request.state.table_versions，读取单条缓存时使用同一计数。
+    """
+    versions = get_table_versions(db, tables)
+    request.state.table_versions = versions
+    parts = [request.url.path, str(sorted(request.query_params.multi_items()))]
+    parts += [f"{table}:{versions.get(table, 0)}" for table in tables]
+    if time_dependent:
+        parts.append(datetime.utcnow().strftime("%Y%m%d%H%M"))
+    etag = '"' + hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in candidates or etag in candidates:
+            metrics.record_cache("etag", hit=True)
+            return Response(status_code=304, headers=headers)
+    metrics.record_cache("etag", hit=False)
+    response.headers.update(headers)
+    return None
+
+@app.get("/", response_model=schemas.MessageResponse)
 async def root():
     return {"message": "德国入籍考试学习助手 API"}
 
-@app.get("/health")
+@app.get("/health", response_model=schemas.HealthStatus)
 async def health_check():
     return {"status": "OK", "message": "服务运行正常"}
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus 监控指标"""
+    content, content_type = metrics.render_metrics()
+    return Response(content=content, headers={"Content-Type": content_type})
+
+@app.get("/api/cache/stats", response_model=Dict[str, schemas.CacheStats])
+async def get_cache_stats():
+    """单条题目/词汇缓存的命中率（本进程）"""
+    return {cache.name: cache.stats() for cache in (question_cache, vocabulary_cache)}
+
 # 题目管理API
-@app.get("/api/questions")
-async def get_questions(skip: int = 0, limit: int = 50, category: str = None, difficulty: str = None):
-    """获取题目列表"""
-    from database import get_db
-    db = next(get_db())
-    return Question.get_questions(db, skip=skip, limit=limit, category=category, difficulty=difficulty)
-
-@app.get("/api/questions/{question_id}")
-async def get_question(question_id: int):
+@app.get("/api/questions", response_model=List[schemas.Question])
+async def get_questions(request: Request, response: Response, skip: int = 0, limit: int = 50, category: str = None,
+                        difficulty: str = None, fields: str = None, db: Session = Depends(get_db)):
+    """获取题目列表（fields=id,german_text 只返回指定字段）"""
+    selected = parse_fields(fields, schemas.Question)
+    not_modified = check_etag(request, response, db, ("questions",))
+    if not_modified:
+        return not_modified
+    questions = Question.get_questions(db, skip=skip, limit=limit, category=category, difficulty=difficulty,
+                                       fields=selected)
+    if selected:
+        return ORJSONResponse(questions, headers=dict(response.headers))
+    return questions
+
+@app.get("/api/questions/similar", response_model=List[schemas.SimilarQuestion])
+async def get_similar_questions(q: str, threshold: float = 0.6, limit: int = 5, db: Session = Depends(get_db)):
+    """查找近似重复的题目（容忍OCR噪声）"""
+    return Question.find_similar(db, q, threshold=threshold, limit=max(1, min(limit, 50)))
+
+@app.get("/api/questions/{question_id}", response_model=schemas.Question)
+async def get_question(request: Request, response: Response, question_id: int, db: Session = Depends(get_db)):
     """获取单个题目"""
-    from database import get_db
-    db = next(get_db())
-    question = Question.get_question(db, question_id)
+    not_modified = check_etag(request, response, db, ("questions",))
+    if not_modified:
+        return not_modified
+    question = Question.get_question(db, question_id, request.state.table_versions.get("questions", 0))
     if not question:
         raise HTTPException(status_code=404, detail="题目不存在")
     return question
 
-@app.post("/api/questions")
-async def create_question(question: QuestionCreate = Body(...)):
-    """创建新题目"""
-    from database import get_db
-    db = next(get_db())
+@app.post("/api/questions", response_model=schemas.QuestionCreateResult)
+async def create_question(question: QuestionCreate = Body(...), allow_duplicate: bool = False,
+                          db: Session = Depends(get_db)):
+    """创建新题目（默认拒绝题干、选项和答案都相同的题目；题干相似的已有题目在 similar 中提示）"""
     try:
-        db_question = Question.create_question(db, question)
-        return db_question
+        db_question = Question.create_question(db, question, allow_duplicate=allow_duplicate)
+    except DuplicateQuestionError as e:
+        raise HTTPException(status_code=409, detail={"message": "题库中已存在相同题目", "similar": e.similar})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"创建题目失败: {str(e)}")
+    similar = Question.find_similar(db, db_question.german_text, exclude_id=db_question.id)
+    return schemas.QuestionCreateResult(**schemas.Question.model_validate(db_question).model_dump(), similar=similar)
 
-@app.put("/api/questions/{question_id}")
-async def update_question(question_id: int, question: QuestionUpdate):
+@app.put("/api/questions/{question_id}", response_model=schemas.Question)
+async def update_question(question_id: int, question: QuestionUpdate, db: Session = Depends(get_db)):
     """更新题目"""
-    from database import get_db
-    db = next(get_db())
     updated_question = Question.update_question(db, question_id, question)
     if not updated_question:
         raise HTTPException(status_code=404, detail="题目不存在")
     return updated_question
 
-@app.delete("/api/questions/{question_id}")
-async def delete_question(question_id: int):
+@app.delete("/api/questions/{question_id}", response_model=schemas.MessageResponse)
+async def delete_question(question_id: int, db: Session = Depends(get_db)):
     """删除题目"""
-    from database import get_db
-    db = next(get_db())
     success = Question.delete_question(db, question_id)
     if not success:
         raise HTTPException(status_code=404, detail="题目不存在")
     return {"message": "删除成功"}
 
-@app.get("/api/questions/stats/summary")
-async def get_question_stats():
+@app.post("/api/questions/grade", response_model=schemas.GradeResult)
+async def grade_questions(request: schemas.GradeRequest, db: Session = Depends(get_db)):
+    """批量判分（一次查询），默认为判过分的题目批量写入学习记录"""
+    results = Question.grade_answers(db, [answer.dict() for answer in request.answers], record=request.record,
+                                     user_id=request.user_id)
+    return {"total": len(results), "correct": sum(1 for result in results if result["is_correct"]),
+            "results": results}
+
+@app.get("/api/questions/stats/summary", response_model=schemas.QuestionStats)
+async def get_question_stats(request: Request, response: Response, db: Session = Depends(get_db)):
     """获取题目统计"""
-    from database import get_db
-    db = next(get_db())
+    not_modified = check_etag(request, response, db, ("questions",))
+    if not_modified:
+        return not_modified
     return Question.get_stats(db)
 
 # 词汇管理API
-@app.get("/api/vocabulary")
-async def get_vocabulary(skip: int = 0, limit: int = 50, difficulty: str = None):
-    """获取词汇列表"""
-    from database import get_db
-    db = next(get_db())
-    return Vocabulary.get_vocabulary(db, skip=skip, limit=limit, difficulty=difficulty)
-
-@app.get("/api/vocabulary/review")
-async def get_review_vocabulary(limit: int = 20):
+@app.get("/api/vocabulary", response_model=List[schemas.Vocabulary])
+async def get_vocabulary(request: Request, response: Response, skip: int = 0, limit: int = 50, difficulty: str = None,
+                         fields: str = None, db: Session = Depends(get_db)):
+    """获取词汇列表（fields=id,german_word 只返回指定字段）"""
+    selected = parse_fields(fields, schemas.Vocabulary)
+    not_modified = check_etag(request, response, db, ("vocabulary",))
+    if not_modified:
+        return not_modified
+    vocabulary = Vocabulary.get_vocabulary(db, skip=skip, limit=limit, difficulty=difficulty, fields=selected)
+    if selected:
+        return ORJSONResponse(vocabulary, headers=dict(response.headers))
+    return vocabulary
+
+@app.get("/api/vocabulary/review", response_model=List[schemas.Vocabulary])
+async def get_review_vocabulary(request: Request, response: Response, limit: int = 20, db: Session = Depends(get_db)):
     """获取需要复习的词汇"""
-    from database import get_db
-    db = next(get_db())
+    not_modified = check_etag(request, response, db, ("vocabulary",), time_dependent=True)
+    if not_modified:
+        return not_modified
     return Vocabulary.get_review_vocabulary(db, limit=limit)
 
-@app.get("/api/vocabulary/{vocabulary_id}")
-async def get_vocabulary_item(vocabulary_id: int):
+@app.get("/api/vocabulary/lookup", response_model=schemas.VocabularyLookupResult)
+async def lookup_vocabulary(q: str, limit: int = 5):
+    """容错查找已知单词（允许一个字母的OCR错误）"""
+    await refresh_known_vocabulary()
+    return {"query": q, "matches": vocabulary_service.lookup_word(q, limit=max(1, min(limit, 50)))}
+
+@app.get("/api/vocabulary/{vocabulary_id}", response_model=schemas.Vocabulary)
+async def get_vocabulary_item(request: Request, response: Response, vocabulary_id: int, db: Session = Depends(get_db)):
     """获取单个词汇"""
-    from database import get_db
-    db = next(get_db())
-    vocabulary = Vocabulary.get_vocabulary_item(db, vocabulary_id)
+    not_modified = check_etag(request, response, db, ("vocabulary", "vocabulary_content"))
+    if not_modified:
+        return not_modified
+    vocabulary = Vocabulary.get_vocabulary_item(db, vocabulary_id,
+                                                request.state.table_versions.get("vocabulary_content", 0))
     if not vocabulary:
         raise HTTPException(status_code=404, detail="词汇不存在")
     return vocabulary
 
-@app.post("/api/vocabulary")
-async def create_vocabulary(vocabulary: VocabularyCreate = Body(...)):
+@app.post("/api/vocabulary", response_model=schemas.Vocabulary)
+async def create_vocabulary(vocabulary: VocabularyCreate = Body(...), db: Session = Depends(get_db)):
     """创建新词汇"""
-    from database import get_db
-    db = next(get_db())
     try:
         db_vocabulary = Vocabulary.create_vocabulary(db, vocabulary)
+        vocabulary_service.add_known_word(db_vocabulary.german_word, db_vocabulary.id)
         return db_vocabulary
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"创建词汇失败: {str(e)}")
 
-@app.put("/api/vocabulary/{vocabulary_id}")
-async def update_vocabulary(vocabulary_id: int, vocabulary: VocabularyUpdate):
+@app.post("/api/vocabulary/batch", response_model=List[schemas.Vocabulary])
+async def create_vocabulary_batch(items: List[VocabularyCreate] = Body(...), db: Session = Depends(get_db)):
+    """批量创建词汇（已存在的单词只补充提供的字段）"""
+    try:
+        db_vocabulary = Vocabulary.upsert_vocabulary(db, items)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"创建词汇失败: {str(e)}")
+    for item in db_vocabulary:
+        vocabulary_service.add_known_word(item.german_word, item.id)
+    return db_vocabulary
+
+@app.put("/api/vocabulary/{vocabulary_id}", response_model=schemas.Vocabulary)
+async def update_vocabulary(vocabulary_id: int, vocabulary: VocabularyUpdate, db: Session = Depends(get_db)):
     """更新词汇"""
-    from database import get_db
-    db = next(get_db())
-    updated_vocabulary = Vocabulary.update_vocabulary(db, vocabulary_id, vocabulary)
+    existing = Vocabulary.get_vocabulary_item(db, vocabulary_id)
+    old_word = existing.german_word if existing else None
+    try:
+        updated_vocabulary = Vocabulary.update_vocabulary(db, vocabulary_id, vocabulary)
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="词汇库中已存在相同的德语单词")
     if not updated_vocabulary:
         raise HTTPException(status_code=404, detail="词汇不存在")
+    if old_word != updated_vocabulary.german_word:
+        vocabulary_service.remove_known_word(old_word)
+        vocabulary_service.add_known_word(updated_vocabulary.german_word, updated_vocabulary.id)
     return updated_vocabulary
 
-@app.delete("/api/vocabulary/{vocabulary_id}")
-async def delete_vocabulary(vocabulary_id: int):
+@app.delete("/api/vocabulary/{vocabulary_id}", response_model=schemas.MessageResponse)
+async def delete_vocabulary(vocabulary_id: int, db: Session = Depends(get_db)):
     """删除词汇"""
-    from database import get_db
-    db = next(get_db())
+    existing = Vocabulary.get_vocabulary_item(db, vocabulary_id)
+    word = existing.german_word if existing else None
     success = Vocabulary.delete_vocabulary(db, vocabulary_id)
     if not success:
         raise HTTPException(status_code=404, detail="词汇不存在")
+    vocabulary_service.remove_known_word(word)
     return {"message": "删除成功"}
 
-@app.post("/api/vocabulary/{vocabulary_id}/review")
-async def record_vocabulary_review(vocabulary_id: int, is_correct: bool):
-    """记录词汇复习结果"""
-    from database import get_db
-    db = next(get_db())
-    success = Vocabulary.record_review(db, vocabulary_id, is_correct)
-    if not success:
+async def record_review(db, vocabulary_id: int, is_correct: bool, user_id: int = None):
+    """经过批量写入缓冲记录一条复习结果"""
+    if not Vocabulary.exists(db, vocabulary_id):
         raise HTTPException(status_code=404, detail="词汇不存在")
+    # 等待批量写入之前先归还连接：否则并发的复习请求占满连接池，写入线程反而拿不到连接
+    db.close()
+    future = review_service.record_review(vocabulary_id, is_correct, user_id=user_id)
+    if review_service.durability != "async":
+        await asyncio.wrap_future(future)
     return {"message": "复习记录成功"}
 
-@app.get("/api/vocabulary/stats/summary")
-async def get_vocabulary_stats():
+@app.post("/api/vocabulary/{vocabulary_id}/review", response_model=schemas.MessageResponse)
+async def record_vocabulary_review(vocabulary_id: int, is_correct: bool, db: Session = Depends(get_db)):
+    """记录词汇复习结果"""
+    return await record_review(db, vocabulary_id, is_correct)
+
+@app.get("/api/vocabulary/stats/summary", response_model=schemas.VocabularyStats)
+async def get_vocabulary_stats(request: Request, response: Response, db: Session = Depends(get_db)):
     """获取词汇统计"""
-    from database import get_db
-    db = next(get_db())
+    not_modified = check_etag(request, response, db, ("vocabulary",), time_dependent=True)
+    if not_modified:
+        return not_modified
     return Vocabulary.get_stats(db)
 
+# 多用户API：复习进度按用户分别保存（user_id 由调用方分配），词汇库共用
+@app.get("/api/users/{user_id}/vocabulary/review", response_model=List[schemas.Vocabulary])
+async def get_user_review_vocabulary(request: Request, response: Response, user_id: int, limit: int = 20,
+                                     db: Session = Depends(get_db)):
+    """获取用户需要复习的词汇（复习次数和时间是该用户的）"""
+    not_modified = check_etag(request, response, db, ("vocabulary", "user_vocabulary_state"), time_dependent=True)
+    if not_modified:
+        return not_modified
+    return UserVocabularyState.get_review_queue(db, user_id, limit=limit)
+
+@app.post("/api/users/{user_id}/vocabulary/{vocabulary_id}/review", response_model=schemas.MessageResponse)
+async def record_user_vocabulary_review(user_id: int, vocabulary_id: int, is_correct: bool,
+                                        db: Session = Depends(get_db)):
+    """记录用户的词汇复习结果"""
+    return await record_review(db, vocabulary_id, is_correct, user_id=user_id)
+
+@app.get("/api/users/{user_id}/vocabulary/stats/summary", response_model=schemas.UserVocabularyStats)
+async def get_user_vocabulary_stats(request: Request, response: Response, user_id: int,
+                                    db: Session = Depends(get_db)):
+    """获取用户的词汇学习进度"""
+    not_modified = check_etag(request, response, db, ("vocabulary", "user_vocabulary_state"), time_dependent=True)
+    if not_modified:
+        return not_modified
+    return UserVocabularyState.get_stats(db, user_id)
+
+# 仪表板API
+# 仪表板数据按ETag（相关表的变更计数 + 当前分钟）缓存，同时最多复用 DASHBOARD_CACHE_SECONDS 秒
+DASHBOARD_CACHE_SECONDS = float(os.getenv("DASHBOARD_CACHE_SECONDS", "30"))
+_dashboard_cache = {"etag": None, "expires": 0.0, "data": None}
+
+@app.get("/api/dashboard", response_model=schemas.Dashboard)
+async def get_dashboard(request: Request, response: Response, recent_limit: int = 5, review_limit: int = 5,
+                        db: Session = Depends(get_db)):
+    """仪表板数据：题目统计、词汇统计、最近添加的题目和待复习词汇，一次请求返回"""
+    not_modified = check_etag(request, response, db, ("questions", "vocabulary"), time_dependent=True)
+    if not_modified:
+        return not_modified
+
+    etag = response.headers["ETag"]
+    cached = _dashboard_cache
+    if cached["etag"] == etag and time.monotonic() < cached["expires"]:
+        metrics.record_cache("dashboard", hit=True)
+        return cached["data"]
+    metrics.record_cache("dashboard", hit=False)
+
+    data = schemas.Dashboard(
+        question_stats=Question.get_stats(db),
+        vocabulary_stats=Vocabulary.get_stats(db),
+        recent_questions=Question.get_recent_questions(db, limit=max(1, min(recent_limit, 50))),
+        review_vocabulary=Vocabulary.get_review_vocabulary(db, limit=max(1, min(review_limit, 50))),
+    )
+    _dashboard_cache.update(etag=etag, expires=time.monotonic() + DASHBOARD_CACHE_SECONDS, data=data)
+    return data
+
+# 搜索API
+@app.get("/api/search", response_model=schemas.SearchResult)
+async def search(q: str, scope: str = "all", limit: int = 20, db: Session = Depends(get_db)):
+    """全文检索题目和词汇（支持前缀匹配和变音字母折叠）"""
+    if scope not in ("all", "questions", "vocabulary"):
+        raise HTTPException(status_code=400, detail="scope 必须是 all、questions 或 vocabulary")
+    limit = max(1, min(limit, 100))
+    result = {"query": q, "questions": [], "vocabulary": []}
+    if scope in ("all", "questions"):
+        result["questions"] = Question.search(db, q, limit=limit)
+    if scope in ("all", "vocabulary"):
+        result["vocabulary"] = Vocabulary.search(db, q, limit=limit)
+    return result
+
+# 模拟考试API
+@app.get("/api/exams", response_model=schemas.Exam)
+async def generate_exam(size: int = ExamService.DEFAULT_SIZE, seed: int = None, db: Session = Depends(get_db)):
+    """按类别分层随机抽题生成模拟考试（同样的 seed 得到同一份试卷，不含答案）"""
+    return exam_service.generate(db, size=size, seed=seed)
+
+@app.post("/api/exams/grade", response_model=schemas.ExamResult)
+async def grade_exam(submission: schemas.ExamSubmission, db: Session = Depends(get_db)):
+    """批量判分：返回每题是否正确、正确答案、得分和是否及格"""
+    return exam_service.grade(db, [answer.dict() for answer in submission.answers], user_id=submission.user_id)
+
+# 学习分析API
+@app.get("/api/analytics/daily", response_model=List[schemas.DailyStats])
+async def get_daily_analytics(request: Request, response: Response, days: int = 30, db: Session = Depends(get_db)):
+    """最近N天每天的复习次数和正确率"""
+    not_modified = check_etag(request, response, db, ("study_records",), time_dependent=True)
+    if not_modified:
+        return not_modified
+    return analytics_service.daily_stats(db, days=max(1, min(days, 366)))
+
+@app.get("/api/analytics/items", response_model=List[schemas.ItemStats])
+async def get_item_analytics(request: Request, response: Response, item_type: str = "vocabulary",
+                             min_reviews: int = 3, limit: int = 20, db: Session = Depends(get_db)):
+    """错误率最高的词汇或题目（全部用户合计）"""
+    if item_type not in ("vocabulary", "question"):
+        raise HTTPException(status_code=400, detail="item_type 必须是 vocabulary 或 question")
+    not_modified = check_etag(request, response, db, ("study_records",))
+    if not_modified:
+        return not_modified
+    return analytics_service.item_stats(db, item_type=item_type, min_reviews=min_reviews,
+                                        limit=max(1, min(limit, 200)))
+
+@app.get("/api/analytics/streak", response_model=schemas.StudyStreak)
+async def get_study_streak(request: Request, response: Response, db: Session = Depends(get_db)):
+    """连续学习天数"""
+    not_modified = check_etag(request, response, db, ("study_records",), time_dependent=True)
+    if not_modified:
+        return not_modified
+    return analytics_service.study_streak(db)
+
+@app.get("/api/analytics/forgetting-curve", response_model=schemas.ForgettingCurve)
+async def get_forgetting_curve(request: Request, response: Response, db: Session = Depends(get_db)):
+    """根据全部词汇复习记录拟合遗忘曲线"""
+    not_modified = check_etag(request, response, db, ("study_records",))
+    if not_modified:
+        return not_modified
+    # 需要扫描全部学习记录，放到线程池中执行，不阻塞其他请求
+    return await run_in_threadpool(analytics_service.forgetting_curve, db)
+
+# 数据导出API
+@app.get("/api/export/{table}")
+async def export_table(table: str, format: str = "ndjson", since: datetime = None):
+    """流式导出整张表（ndjson 或 csv），since 只导出该时间之后更新/创建的行"""
+    if table not in EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail=f"不支持导出的表: {table}")
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format 必须是 ndjson 或 csv")
+
+    def generate():
+        db = SessionLocal()
+        try:
+            if format == "csv":
+                columns = EXPORT_TABLES[table][0].__table__.columns
+                # JSON列（如 choices）写成JSON文本，而不是Python的repr
+                json_columns = [c.name for c in columns if isinstance(c.type, JSON)]
+                buffer = io.StringIO()
+                writer = csv.DictWriter(buffer, fieldnames=[c.name for c in columns])
+                writer.writeheader()
+                for batch in iter_export_batches(db, table, since=since):
+                    for row in batch:
+                        for name in json_columns:
+                            if row[name] is not None:
+                                row[name] = orjson.dumps(row[name]).decode()
+                    writer.writerows(batch)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                yield buffer.getvalue()
+            else:
+                for batch in iter_export_batches(db, table, since=since):
+                    yield b"".join(orjson.dumps(row) + b"\n" for row in batch)
+        finally:
+            db.close()
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{table}.{format}"'}
+    )
+
 # OCR和翻译API
-@app.post("/api/ocr/process-image")
+async def read_upload_image(image: UploadFile):
+    """
+    校验并解码上传的图片
+
+    分块读取时检查大小，从文件头判断格式和尺寸，过大的图片在解码时缩小；
+    不合格的上传在OCR之前以413（过大）、415（格式不支持）或400（无法解码）拒绝。
+    """
+    try:
+        upload = await upload_service.read_image(image)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    decoded = await run_in_threadpool(ocr_service.decode_image, upload.data, upload.format, upload.width, upload.height)
+    if decoded is None:
+        metrics.UPLOADS_REJECTED.labels(reason="corrupt").inc()
+        raise HTTPException(status_code=400, detail="无法解码图片")
+    return decoded
+
+@app.post("/api/ocr/process-image", response_model=schemas.OCRResult)
 async def process_image(image: UploadFile = File(...)):
     """处理图片识别和翻译"""
-    # 保存上传的图片
-    file_path = f"uploads/{datetime.now().strftime('%Y%m%d_%H%M%S')}_{image.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(image.file, buffer)
+    decoded = await read_upload_image(image)
+
+    # OCR识别和翻译是阻塞调用，放到线程池中执行，不阻塞其他请求
+    german_text = await run_in_threadpool(ocr_service.recognize_text, decoded)
+    if not german_text:
+        raise HTTPException(status_code=400, detail="无法识别图片中的文本")
     
-    try:
-        # OCR识别
-        german_text = ocr_service.recognize_text(file_path)
-        if not german_text:
-            raise HTTPException(status_code=400, detail="无法识别图片中的文本")
-        
-        # 翻译
-        chinese_translation = translation_service.translate(german_text)
-        
-        # 检测高级词汇
+    # 翻译
+    chinese_translation = await run_in_threadpool(translation_service.translate, german_text)
+    
+    # 检测高级词汇
+    await refresh_known_vocabulary()
+    with metrics.track_stage("vocabulary_detection"):
         vocabulary_words = vocabulary_service.detect_advanced_vocabulary(german_text)
-        
-        return {
+    
+    return {
+        "german_text": german_text,
+        "chinese_translation": chinese_translation,
+        "vocabulary_words": vocabulary_words
+    }
+
+@app.post("/api/ingest/ocr-page", response_model=schemas.OCRPageIngestResult)
+async def ingest_ocr_page_endpoint(page: schemas.OCRPageIngest = Body(...), allow_duplicate: bool = False,
+                                   db: Session = Depends(get_db)):
+    """
+    保存OCR页面：题目和全部词汇在一个事务中写入，缺少的翻译通过一次批量翻译补全
+
+    已有相同题目时返回409；题干相似的已有题目在 similar 中提示。
+    """
+    question, items = page.question, page.vocabulary
+    # 先查重，避免为注定被拒绝的页面调用翻译
+    if not allow_duplicate:
+        duplicate = Question.find_duplicate(db, question)
+        if duplicate:
+            raise HTTPException(status_code=409, detail={"message": "题库中已存在相同题目", "similar": [duplicate]})
+
+    translated_count = 0
+    if page.fill_translations:
+        # 词库中或本批次中（大小写不同的写法）已有翻译的单词不需要翻译，upsert 会保留已有翻译
+        known = Vocabulary.get_translations(db, [item.german_word for item in items if not item.chinese_translation])
+        known.update((normalize_word(item.german_word), item.chinese_translation)
+                     for item in items if item.chinese_translation)
+        missing = {}  # 规范化键 -> 需要补翻译的词汇下标（同一个词只翻译一次）
+        for i, item in enumerate(items):
+            key = normalize_word(item.german_word)
+            if not item.chinese_translation and key not in known:
+                missing.setdefault(key, []).append(i)
+        texts = [items[indexes[0]].german_word for indexes in missing.values()]
+        if not question.chinese_translation:
+            texts.append(question.german_text)
+        if texts:
+            # 翻译需要网络请求并且有限速等待，放到线程池中执行，不阻塞其他请求
+            translations = await run_in_threadpool(translation_service.batch_translate, texts)
+            # 翻译失败时得到的是备用翻译的占位文本，按缺失处理，不写入数据库也不计数
+            if not question.chinese_translation:
+                translation = translations.pop()
+                if not translation_service.is_fallback(translation):
+                    question = QuestionCreate(**{**question.dict(exclude_unset=True),
+                                                 "chinese_translation": translation})
+                    translated_count += 1
+            items = list(items)
+            for indexes, translation in zip(missing.values(), translations):
+                if translation_service.is_fallback(translation):
+                    continue
+                translated_count += 1  # 同一个词在批次中多次出现也只保存为一条
+                for i in indexes:
+                    items[i] = VocabularyCreate(**{**items[i].dict(exclude_unset=True),
+                                                   "chinese_translation": translation})
+
+    try:
+        # 已经查过重，事务中不再重复查询
+        db_question, db_vocabulary = ingest_ocr_page(db, question, items, allow_duplicate=True)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"保存OCR页面失败: {str(e)}")
+    for item in db_vocabulary:
+        vocabulary_service.add_known_word(item.german_word, item.id)
+    similar = Question.find_similar(db, db_question.german_text, exclude_id=db_question.id)
+    return {"question": db_question, "vocabulary": db_vocabulary, "translated_count": translated_count,
+            "similar": similar}
+
+def _sse(event: str, data) -> bytes:
+    """Server-Sent Events 格式的一条事件"""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+@app.post("/api/ocr/process-image/stream")
+async def process_image_stream(image: UploadFile = File(...)):
+    """
+    流式处理图片识别和翻译（text/event-stream）
+
+    每完成一步就推送事件，不必等整个流程结束：
+    line（识别出的文本行）→ vocabulary（高级词汇，本地计算，紧接着识别结果推送）→ translation（逐句翻译）
+    → done（完整结果，与 /api/ocr/process-image 的返回相同）；识别失败时推送 error。
+    各句通过一次批量请求翻译（只受一次请求频率限制），翻译完成后逐句推送。
+    不合格的上传在开始推送之前直接返回错误状态码。
+    """
+    decoded = await read_upload_image(image)
+
+    async def events():
+        # OCR和翻译是阻塞调用，放到线程池中执行，事件可以及时发出
+        lines = await run_in_threadpool(ocr_service.recognize_lines, decoded)
+        if not lines:
+            yield _sse("error", {"detail": "无法识别图片中的文本"})
+            return
+        for index, (text, confidence) in enumerate(lines):
+            yield _sse("line", {"index": index, "text": text, "confidence": round(confidence, 3)})
+        german_text = " ".join(text for text, _ in lines)
+
+        await refresh_known_vocabulary()
+        with metrics.track_stage("vocabulary_detection"):
+            vocabulary_words = vocabulary_service.detect_advanced_vocabulary(german_text)
+        yield _sse("vocabulary", {"vocabulary_words": vocabulary_words})
+
+        sentences = translation_service.split_sentences(german_text)
+        translations = await run_in_threadpool(translation_service.batch_translate, sentences)
+        for index, (sentence, translation) in enumerate(zip(sentences, translations)):
+            yield _sse("translation", {"index": index, "german_text": sentence, "chinese_translation": translation})
+
+        yield _sse("done", {
             "german_text": german_text,
-            "chinese_translation": chinese_translation,
+            "chinese_translation": " ".join(translations),
             "vocabulary_words": vocabulary_words
-        }
-    finally:
-        # 清理临时文件
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        })
+
+    # 显式的 Content-Encoding 让 GZipMiddleware 直接透传，否则压缩缓冲会攒住事件
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "Content-Encoding": "identity",
+        "X-Accel-Buffering": "no",
+    })
 
-@app.post("/api/ocr/translate")
+@app.post("/api/ocr/translate", response_model=schemas.TranslationResult)
 async def translate_text(text: str):
     """翻译文本"""
     translation = translation_service.translate(text)
@@ -219,4 +677,5 @@ async def translate_text(text: str):
     }
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
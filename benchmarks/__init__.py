@@ -0,0 +1 @@
+"""性能测试：合成数据生成、HTTP负载测试"""
@@ -0,0 +1,329 @@
+"""
+HTTP 负载测试
+
+在进程内启动应用（uvicorn 跑在后台线程，OCR和翻译使用替身），用异步客户端按接口族
+并发压测，输出吞吐量和 p50/p95/p99 延迟。结果保存为JSON，可以和其他提交的结果对比。
+
+用法：
+    python -m benchmarks.load_test                           # 默认规模数据库，全部负载
+    python -m benchmarks.load_test --scale 0.01 --duration 5 # 小规模试跑
+    python -m benchmarks.load_test --workloads search,mixed --concurrency 32
+    python -m benchmarks.load_test --compare benchmarks/results/<旧结果>.json
+    python -m benchmarks.load_test --database-url postgresql+psycopg2://postgres@localhost/einbuergung_bench
+
+测试会复制一份合成数据库再运行，写入类负载不会改动缓存的数据库
+（PostgreSQL 用 CREATE DATABASE ... TEMPLATE 复制，连接的用户需要有建库权限）。
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stubs import install_stubs
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+class Dataset:
+    """生成请求参数用的样本（从测试数据库中读取）"""
+
+    def __init__(self, url: str, sample_size: int = 2000):
+        from sqlalchemy import create_engine, text
+        engine = create_engine(url)
+        with engine.connect() as conn:
+            scalar = lambda sql: conn.execute(text(sql)).scalar()
+            self.question_count = scalar("SELECT max(id) FROM questions") or 1
+            self.vocabulary_count = scalar("SELECT max(id) FROM vocabulary") or 1
+            self.study_record_count = scalar("SELECT count(*) FROM study_records")
+            self.words = conn.execute(text(
+                "SELECT german_word FROM vocabulary ORDER BY random() LIMIT :n"), {"n": sample_size}).scalars().all()
+            self.question_texts = conn.execute(text(
+                "SELECT german_text FROM questions ORDER BY random() LIMIT :n"), {"n": sample_size}).scalars().all()
+        engine.dispose()
+        self.image = _make_image()
+
+def _make_image() -> bytes:
+    """OCR负载上传的图片（内容无关紧要，OCR是替身）"""
+    import io
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (800, 600), "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def _typo(rng: random.Random, word: str) -> str:
+    """模拟一个字母的OCR错误"""
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word))
+    return word[:i] + rng.choice("aeinrst") + word[i + 1:]
+
+# 多用户负载中的用户数
+USERS = 1000
+
+def build_workloads(data: Dataset) -> dict:
+    """负载名 -> 生成一次请求的协程函数 (client, rng) -> Response"""
+    def get(path_fn):
+        async def request(client, rng):
+            return await client.get(path_fn(rng))
+        return request
+
+    async def review(client, rng):
+        return await client.post(f"/api/vocabulary/{rng.randint(1, data.vocabulary_count)}/review",
+                                 params={"is_correct": rng.random() < 0.7})
+
+    async def user_review(client, rng):
+        return await client.post(f"/api/users/{rng.randint(1, USERS)}/vocabulary/"
+                                 f"{rng.randint(1, data.vocabulary_count)}/review",
+                                 params={"is_correct": rng.random() < 0.7})
+
+    async def create_vocabulary(client, rng):
+        word = f"{rng.choice(data.words)}{rng.randrange(10 ** 9)}"
+        return await client.post("/api/vocabulary/batch", json=[{"german_word": word, "chinese_translation": "测试"}])
+
+    async def ocr(client, rng):
+        return await client.post("/api/ocr/process-image", files={"image": ("page.png", data.image, "image/png")})
+
+    workloads = {
+        "questions_list": get(lambda rng: f"/api/questions?skip={rng.randrange(data.question_count)}&limit=50"),
+        "questions_list_sparse": get(
+            lambda rng: f"/api/questions?skip={rng.randrange(data.question_count)}&limit=50&fields=id,german_text"),
+        "question_detail": get(lambda rng: f"/api/questions/{rng.randint(1, data.question_count)}"),
+        "vocabulary_list": get(lambda rng: f"/api/vocabulary?skip={rng.randrange(data.vocabulary_count)}&limit=50"),
+        "vocabulary_detail": get(lambda rng: f"/api/vocabulary/{rng.randint(1, data.vocabulary_count)}"),
+        "review_queue": get(lambda rng: "/api/vocabulary/review?limit=20"),
+        "stats": get(lambda rng: rng.choice(["/api/questions/stats/summary", "/api/vocabulary/stats/summary"])),
+        "dashboard": get(lambda rng: "/api/dashboard"),
+        "search": get(lambda rng: f"/api/search?q={rng.choice(data.words)[:rng.randint(3, 6)]}"),
+        "lookup": get(lambda rng: f"/api/vocabulary/lookup?q={_typo(rng, rng.choice(data.words))}"),
+        "similar": get(lambda rng: f"/api/questions/similar?q={_typo(rng, rng.choice(data.question_texts))}"),
+        "exam": get(lambda rng: "/api/exams"),
+        "analytics": get(lambda rng: rng.choice(["/api/analytics/daily", "/api/analytics/items",
+                                                 "/api/analytics/streak", "/api/analytics/forgetting-curve"])),
+        "review": review,
+        "user_review_queue": get(lambda rng: f"/api/users/{rng.randint(1, USERS)}/vocabulary/review?limit=20"),
+        "user_review": user_review,
+        "create_vocabulary": create_vocabulary,
+        "ocr": ocr,
+    }
+
+    # 混合负载：大致按学习时的使用比例加权
+    weights = {"questions_list_sparse": 10, "question_detail": 20, "vocabulary_list": 5, "review_queue": 10,
+               "search": 15, "lookup": 10, "stats": 5, "analytics": 5, "review": 18, "create_vocabulary": 2}
+    names, cumulative = list(weights), []
+    total = 0
+    for name in names:
+        total += weights[name]
+        cumulative.append(total)
+
+    async def mixed(client, rng):
+        pick = rng.random() * total
+        for name, bound in zip(names, cumulative):
+            if pick < bound:
+                return await workloads[name](client, rng)
+
+    workloads["mixed"] = mixed
+    return workloads
+
+def percentile(sorted_values: list, q: float) -> float:
+    """最近秩法百分位数"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+async def run_workload(client, request_fn, concurrency: int, duration: float, seed: str) -> dict:
+    """concurrency 个并发客户端持续发请求 duration 秒"""
+    latencies, errors, statuses = [], 0, {}
+    deadline = time.perf_counter() + duration
+
+    async def worker(index):
+        nonlocal errors
+        rng = random.Random(f"{seed}-{index}")
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await request_fn(client, rng)
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+            if not (isinstance(status, int) and (status < 400)):
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=str)},
+        "throughput": round(len(latencies) / elapsed, 1),
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1]) if latencies else 0.0,
+    }
+
+def start_server(app):
+    """在后台线程中启动uvicorn，返回 (server, 线程, 基础URL)"""
+    import uvicorn
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="bench-server", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("测试服务启动失败")
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+async def drive(base_url: str, workloads: dict, names: list, args) -> dict:
+    import httpx
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        for name in names:
+            if args.warmup > 0:
+                await run_workload(client, workloads[name], args.concurrency, args.warmup, f"warmup-{name}")
+            results[name] = await run_workload(client, workloads[name], args.concurrency, args.duration,
+                                               f"{args.seed}-{name}")
+            print_row(name, results[name])
+    return results
+
+def git_revision() -> str:
+    try:
+        revision = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD", "--", "*.py"], cwd=ROOT) != 0
+        return revision + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def print_header():
+    print(f"{'负载':<24}{'请求数':>8}{'错误':>6}{'吞吐(req/s)':>13}{'p50(ms)':>10}{'p95(ms)':>10}"
+          f"{'p99(ms)':>10}{'max(ms)':>10}")
+
+def print_row(name: str, r: dict):
+    print(f"{name:<24}{r['requests']:>8}{r['errors']:>6}{r['throughput']:>13}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+          f"{r['p99_ms']:>10}{r['max_ms']:>10}")
+
+def compare(current: dict, baseline: dict):
+    """打印与基准结果相比的吞吐量和p95变化"""
+    print(f"\n与 {baseline['meta']['revision']} ({baseline['meta']['timestamp']}) 对比：")
+    print(f"{'负载':<24}{'吞吐变化':>12}{'p95变化':>12}")
+    for name, r in current["results"].items():
+        old = baseline["results"].get(name)
+        if not old:
+            continue
+        change = lambda new, before: f"{(new - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"{name:<24}{change(r['throughput'], old['throughput']):>12}{change(r['p95_ms'], old['p95_ms']):>12}")
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP 负载测试")
+    parser.add_argument("--db", help="测试数据库（默认按 --scale 生成并缓存在 benchmarks/data/）")
+    parser.add_argument("--database-url", help="在这个PostgreSQL数据库中生成合成数据并测试（代替SQLite文件）")
+    parser.add_argument("--scale", type=float, default=1.0, help="合成数据规模系数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workloads", help="逗号分隔的负载名，默认全部")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="每个负载的测量时长（秒）")
+    parser.add_argument("--warmup", type=float, default=1.0, help="每个负载的预热时长（秒）")
+    parser.add_argument("--ocr-latency", type=float, default=0.2, help="OCR替身的模拟耗时（秒）")
+    parser.add_argument("--translation-latency", type=float, default=0.05, help="翻译替身的模拟耗时（秒）")
+    parser.add_argument("--output", help="结果JSON路径（默认 benchmarks/results/<时间>-<提交>.json）")
+    parser.add_argument("--compare", help="与之前保存的结果JSON对比")
+    args = parser.parse_args()
+
+    # database 模块在导入时按 DATABASE_URL 创建 engine，所以先设置环境变量再导入 seed / app
+    workdir = tempfile.mkdtemp(prefix="einbuergung-bench-")
+    if args.database_url:
+        from sqlalchemy.engine import make_url
+        copy_name = f"einbuergung_loadtest_{os.getpid()}"
+        database_url = make_url(args.database_url).set(database=copy_name).render_as_string(hide_password=False)
+    else:
+        db_path = os.path.join(workdir, "bench.db")
+        database_url = f"sqlite:///{db_path}"
+    os.environ["DATABASE_URL"] = database_url
+
+    from benchmarks.seed import ensure_database, copy_database, drop_database
+    if args.database_url:
+        source = ensure_database(args.scale, args.seed, url=args.database_url)
+        data = Dataset(source)
+        copy_database(source, copy_name)
+    else:
+        source = args.db or ensure_database(args.scale, args.seed)
+        data = Dataset(f"sqlite:///{source}")
+        shutil.copyfile(source, db_path)
+
+    install_stubs(args.ocr_latency, args.translation_latency)
+    os.chdir(workdir)  # uploads/ 等运行时目录建在临时目录中
+    import app as app_module
+    app_module.translation_service.request_interval = 0  # 限流是针对外部翻译API的
+
+    workloads = build_workloads(data)
+    names = args.workloads.split(",") if args.workloads else list(workloads)
+    unknown = [name for name in names if name not in workloads]
+    if unknown:
+        parser.error(f"未知负载: {', '.join(unknown)}（可选: {', '.join(workloads)}）")
+
+    server, thread, base_url = start_server(app_module.app)
+    print(f"数据: {data.question_count} 题目, {data.vocabulary_count} 词汇, "
+          f"{data.study_record_count} 学习记录; 并发 {args.concurrency}, 每个负载 {args.duration:g}s")
+    print_header()
+    try:
+        results = asyncio.run(drive(base_url, workloads, names, args))
+    finally:
+        server.should_exit = True
+        thread.join()
+        shutil.rmtree(workdir, ignore_errors=True)
+        if args.database_url:
+            app_module.engine.dispose()
+            drop_database(database_url)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "database": app_module.engine.dialect.name,
+            "dataset": {"questions": data.question_count, "vocabulary": data.vocabulary_count,
+                        "study_records": data.study_record_count, "seed": args.seed},
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "ocr_latency": args.ocr_latency,
+            "translation_latency": args.translation_latency,
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{report['meta']['revision']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+"""
+热点路径微基准测试（带回归门槛）
+
+对服务层和数据库层的热点函数计时并统计内存分配，和仓库中保存的基准
+（benchmarks/baseline.json）比较，超过容差时以非零状态退出，可以直接用作CI检查。
+全部使用固定的测试数据（德语文本语料、程序生成的样例图片、合成数据库），
+不需要网络，也不需要GPU或OCR模型。
+
+不同机器的绝对速度不同：每一项测量前先测一个固定的纯Python校准负载，
+比较时把基准耗时按两次校准耗时的比例换算后再判断是否变慢；疑似回归的项会重新测量，
+排除偶发的干扰。
+
+用法：
+    python -m benchmarks.micro                    # 运行并与基准比较
+    python -m benchmarks.micro -k vocabulary      # 只运行名称包含 vocabulary 的项
+    python -m benchmarks.micro --update-baseline  # 重新生成基准（有意的性能变化之后）
+    python -m benchmarks.micro --database-url postgresql+psycopg2://user:pw@localhost/bench
+                                                  # 数据库相关的项在PostgreSQL上测量，与 baseline-postgresql.json 比较
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.stubs import install_stubs
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+# 数据库项在不同后端上的耗时不可比，PostgreSQL 使用单独的基准文件
+POSTGRES_BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline-postgresql.json")
+FIXTURES_DIR = os.path.join(ROOT, "benchmarks", "fixtures")
+# 微基准使用的合成数据库规模（1000题目、500词汇、5万学习记录）
+DB_SCALE = 0.01
+
+# 默认容差：耗时允许比基准慢 25%，内存峰值允许多 20%
+TIME_TOLERANCE = 0.25
+ALLOC_TOLERANCE = 0.20
+# 内存峰值的绝对余量（字节），避免很小的数值因为少量对象差异被判为回归
+ALLOC_SLACK = 16 * 1024
+
+class Fixtures:
+    """按需构建的测试数据，同一次运行中只构建一次"""
+
+    def __init__(self, database_url: str = None):
+        self._cache = {}
+        self.database_url = database_url
+        self._copy_url = None
+
+    def _get(self, name, factory):
+        if name not in self._cache:
+            self._cache[name] = factory()
+        return self._cache[name]
+
+    @property
+    def corpus(self) -> str:
+        """德语考试文本语料（含少量OCR错字）"""
+        def load():
+            with open(os.path.join(FIXTURES_DIR, "corpus_de.txt"), encoding="utf-8") as f:
+                return f.read()
+        return self._get("corpus", load)
+
+    @property
+    def known_words(self) -> list:
+        from benchmarks.seed import make_words
+        return self._get("known_words", lambda: make_words(5000, seed=7))
+
+    @property
+    def vocabulary_service(self):
+        """已加载5000个词汇库单词的 VocabularyService"""
+        def build():
+            from services.vocabulary_service import VocabularyService
+            service = VocabularyService()
+            for i, word in enumerate(self.known_words, start=1):
+                service.add_known_word(word, i)
+            # 语料中的部分长词也在词汇库中，检测时会走纠错分支
+            for i, word in enumerate(sorted(set(self.corpus.split()))[::7], start=len(self.known_words) + 1):
+                service.add_known_word(word.strip(".,?"), i)
+            return service
+        return self._get("vocabulary_service", build)
+
+    @property
+    def page_image(self):
+        """模拟手机拍摄的试题照片：白底黑字加高斯噪声（固定随机种子）"""
+        def build():
+            import cv2
+            import numpy as np
+            image = np.full((720, 1000, 3), 235, dtype=np.uint8)
+            for i, line in enumerate(self.corpus.splitlines()[:20]):
+                cv2.putText(image, line[:70], (20, 40 + i * 34), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (20, 20, 20), 2)
+            noise = np.random.default_rng(0).normal(0, 12, image.shape)
+            return np.clip(image + noise, 0, 255).astype(np.uint8)
+        return self._get("page_image", build)
+
+    @property
+    def db(self):
+        """
+        合成数据库的内存副本（写入不影响缓存文件，也不受磁盘fsync波动影响）；
+        指定了 database_url 时是该数据库的临时副本
+        """
+        def build():
+            if self.database_url:
+                return self._postgres_db()
+            import sqlite3
+            from sqlalchemy import create_engine
+            from sqlalchemy.orm import Session
+            from sqlalchemy.pool import StaticPool
+            from benchmarks.seed import ensure_database
+            from database import Base, upgrade_schema
+
+            source = sqlite3.connect(ensure_database(DB_SCALE))
+            engine = create_engine("sqlite://", poolclass=StaticPool,
+                                   connect_args={"check_same_thread": False})
+            raw = engine.raw_connection()
+            source.backup(raw.driver_connection)
+            source.close()
+            raw.close()
+            # 缓存的合成数据可能早于后来加入的表和列，和应用启动时一样先补齐
+            Base.metadata.create_all(bind=engine)
+            upgrade_schema(engine)
+            return Session(engine)
+        return self._get("db", build)
+
+    @property
+    def user_states(self) -> int:
+        """在 db 中为2000个用户各写入100个词汇的复习状态（约一半已到期），返回用户数"""
+        def build():
+            from datetime import timedelta
+            from database import UserVocabularyState
+            import random
+            rng = random.Random(3)
+            now = datetime.utcnow()
+            users = 2000
+            rows = [
+                {"user_id": user_id, "vocabulary_id": vocabulary_id, "review_count": 1, "correct_count": 1,
+                 "last_reviewed": now - timedelta(days=2),
+                 "next_review": now + timedelta(hours=rng.randint(-48, 48))}
+                for user_id in range(1, users + 1)
+                for vocabulary_id in rng.sample(range(1, 501), 100)
+            ]
+            self.db.execute(UserVocabularyState.__table__.insert(), rows)
+            self.db.commit()
+            return users
+        return self._get("user_states", build)
+
+    def _postgres_db(self):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import Session
+        from benchmarks.seed import copy_database, ensure_database
+        from database import Base, upgrade_schema
+
+        ensure_database(DB_SCALE, url=self.database_url)
+        self._copy_url = copy_database(self.database_url, f"einbuergung_micro_{os.getpid()}")
+        engine = create_engine(self._copy_url)
+        Base.metadata.create_all(bind=engine)
+        upgrade_schema(engine)
+        return Session(engine)
+
+    def close(self):
+        """删除 PostgreSQL 临时副本"""
+        if self._copy_url:
+            from benchmarks.seed import drop_database
+            db = self._cache.pop("db")
+            db.close()
+            db.get_bind().dispose()
+            drop_database(self._copy_url)
+            self._copy_url = None
+
+# 名称 -> (构建被测函数的工厂, 耗时容差)；工厂接收 Fixtures，返回无参可调用对象
+BENCHMARKS = {}
+
+def benchmark(name: str, time_tolerance: float = TIME_TOLERANCE):
+    def register(factory):
+        BENCHMARKS[name] = (factory, time_tolerance)
+        return factory
+    return register
+
+@benchmark("vocabulary.detect_advanced_vocabulary")
+def _detect_advanced_vocabulary(fx):
+    service, text = fx.vocabulary_service, fx.corpus
+    return lambda: service.detect_advanced_vocabulary(text)
+
+@benchmark("vocabulary.lookup_word")
+def _lookup_word(fx):
+    service = fx.vocabulary_service
+    queries = [w[:3] + "x" + w[4:] if len(w) > 4 else w for w in fx.known_words[:200]]
+    return lambda: [service.lookup_word(q) for q in queries]
+
+@benchmark("ocr.preprocess_image")
+def _preprocess_image(fx):
+    from services.ocr_service import OCRService
+    service = OCRService.__new__(OCRService)  # 预处理不需要OCR模型
+    image = fx.page_image
+    return lambda: service._preprocess_image(image)
+
+@benchmark("ocr.decode_photo")
+def _decode_photo(fx):
+    import cv2
+    from services.ocr_service import OCRService
+    from services.upload_service import sniff_image
+    service = OCRService(max_side=2560)  # 解码不需要OCR模型
+    # 手机拍摄尺寸（4000x2880）的JPEG，解码时缩小到2560以内
+    photo = cv2.resize(fx.page_image, (4000, 2880), interpolation=cv2.INTER_LINEAR)
+    data = cv2.imencode(".jpg", photo, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+    info = sniff_image(data)
+    return lambda: service.decode_image(data, *info)
+
+@benchmark("similarity.band_buckets")
+def _band_buckets(fx):
+    from services.similarity_service import SimilarityService
+    service = SimilarityService()
+    lines = fx.corpus.splitlines()
+    return lambda: [service.band_buckets(line) for line in lines]
+
+@benchmark("review.schedule_review")
+def _schedule_review(fx):
+    from database import Vocabulary
+    item = Vocabulary(german_word="Wahl", review_count=0)
+    now = datetime(2024, 1, 1)
+
+    def run():
+        for i in range(1000):
+            item._schedule_review(i % 4 != 0, now)
+    return run
+
+@benchmark("review.record_review", time_tolerance=0.5)
+def _record_review(fx):
+    from database import Vocabulary
+    db = fx.db
+    counter = iter(range(10 ** 9))
+    return lambda: Vocabulary.record_review(db, next(counter) % 500 + 1, True)
+
+@benchmark("review.user_review_queue", time_tolerance=0.5)
+def _user_review_queue(fx):
+    from database import UserVocabularyState
+    db, users = fx.db, fx.user_states
+    counter = iter(range(10 ** 9))
+    return lambda: UserVocabularyState.get_review_queue(db, next(counter) % users + 1, limit=20)
+
+@benchmark("cache.get_question", time_tolerance=0.5)
+def _get_question(fx):
+    from database import Question, get_table_versions
+    db = fx.db
+    # 反复读取同样的200道题，第一轮之后全部命中缓存；和接口一样传入已读取的变更计数
+    def run():
+        version = get_table_versions(db, ("questions",))["questions"]
+        for question_id in range(1, 201):
+            Question.get_question(db, question_id, version)
+    return run
+
+@benchmark("exam.generate", time_tolerance=0.5)
+def _generate_exam(fx):
+    from services.exam_service import ExamService
+    service, db = ExamService(), fx.db
+    seeds = iter(range(10 ** 9))
+    return lambda: service.generate(db, seed=next(seeds))
+
+@benchmark("exam.grade_answers", time_tolerance=0.5)
+def _grade_answers(fx):
+    from database import Question
+    db = fx.db
+    # 一份33题试卷的答案，混合选项下标和字母；不写学习记录，只测判分
+    answers = [{"question_id": i * 29 % 1000 + 1, "option": i % 4} if i % 2 else
+               {"question_id": i * 29 % 1000 + 1, "answer": "ABCD"[i % 4]} for i in range(33)]
+    return lambda: Question.grade_answers(db, answers, record=False)
+
+@benchmark("stats.question_stats", time_tolerance=0.5)
+def _question_stats(fx):
+    from database import Question
+    db = fx.db
+    return lambda: Question.get_stats(db)
+
+@benchmark("stats.vocabulary_stats", time_tolerance=0.5)
+def _vocabulary_stats(fx):
+    from database import Vocabulary
+    db = fx.db
+    return lambda: Vocabulary.get_stats(db)
+
+@benchmark("stats.analytics_daily", time_tolerance=0.5)
+def _analytics_daily(fx):
+    from services.analytics_service import AnalyticsService
+    service, db = AnalyticsService(), fx.db
+    return lambda: service.daily_stats(db, days=30)
+
+@benchmark("stats.forgetting_curve", time_tolerance=0.5)
+def _forgetting_curve(fx):
+    from services.analytics_service import AnalyticsService
+    service, db = AnalyticsService(), fx.db
+    return lambda: service.forgetting_curve(db)
+
+def _calibration():
+    """固定的纯Python负载，用来换算不同机器之间的速度差异"""
+    data = list(range(20000, 0, -1))
+    table = {}
+    for value in sorted(data):
+        table[value % 1000] = table.get(value % 1000, 0) + value
+    return sum(table.values())
+
+def measure(fn, repeat: int = 7, min_time: float = 0.05) -> dict:
+    """
+    计时并统计内存分配
+
+    先确定每轮循环次数使一轮至少耗时 min_time 秒，再测 repeat 轮取每次调用的中位数和最小值
+    （回归判断用最小值，它受机器上其他负载的干扰最小）；
+    内存峰值用 tracemalloc 单独测一次调用（tracemalloc 会拖慢执行，不能和计时同时进行）。
+    """
+    fn()  # 预热：建立缓存、编译正则等
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or loops >= 10 ** 6:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        timings.append((time.perf_counter() - started) / loops)
+
+    tracemalloc.start()
+    baseline_memory, _ = tracemalloc.get_traced_memory()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "loops": loops,
+        "peak_alloc_bytes": max(0, peak - baseline_memory),
+    }
+
+def measure_calibrated(fn) -> dict:
+    """计时结果附带紧挨着测得的校准耗时，用于换算机器速度的波动"""
+    calibration = measure(_calibration)["min_s"]
+    result = measure(fn)
+    result["calibration_s"] = calibration
+    return result
+
+def compare(result: dict, old: dict, time_tolerance: float):
+    """返回 (耗时变化比例, 内存变化比例, 超出容差的标记列表)"""
+    expected = old["min_s"] * result["calibration_s"] / old["calibration_s"]
+    time_change = result["min_s"] / expected - 1
+    alloc_change = (result["peak_alloc_bytes"] - old["peak_alloc_bytes"]) / max(old["peak_alloc_bytes"], 1)
+    flags = []
+    if time_change > time_tolerance:
+        flags.append("耗时回归")
+    if result["peak_alloc_bytes"] > old["peak_alloc_bytes"] * (1 + ALLOC_TOLERANCE) + ALLOC_SLACK:
+        flags.append("内存回归")
+    return time_change, alloc_change, flags
+
+def _run(names, fixtures, baseline, args):
+    """测量各项并与基准比较，返回 (结果, 超出容差的项)"""
+    results, regressions = {}, []
+    print(f"{'名称':<40}{'最小值(us)':>12}{'中位数(us)':>12}{'内存峰值(KiB)':>14}{'耗时变化':>10}{'内存变化':>10}")
+    for name in names:
+        factory, time_tolerance = BENCHMARKS[name]
+        fn = factory(fixtures)
+        result = measure_calibrated(fn)
+        old = None if args.update_baseline else baseline["results"].get(name)
+        change = ""
+        if old:
+            time_change, alloc_change, flags = compare(result, old, time_tolerance)
+            for _ in range(args.retries):
+                if "耗时回归" not in flags:
+                    break
+                retry = measure_calibrated(fn)
+                if retry["min_s"] / retry["calibration_s"] < result["min_s"] / result["calibration_s"]:
+                    result = retry
+                time_change, alloc_change, flags = compare(result, old, time_tolerance)
+            change = f"{time_change * 100:>+9.1f}%{alloc_change * 100:>+9.1f}%  {' '.join(flags)}"
+            if flags:
+                regressions.append(name)
+        results[name] = result
+        print(f"{name:<40}{result['min_s'] * 1e6:>12.1f}{result['median_s'] * 1e6:>12.1f}"
+              f"{result['peak_alloc_bytes'] / 1024:>14.1f}{change}")
+    return results, regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="热点路径微基准测试")
+    parser.add_argument("-k", dest="keyword", help="只运行名称包含该关键字的项")
+    parser.add_argument("--update-baseline", action="store_true", help="把本次结果写入基准文件")
+    parser.add_argument("--baseline", help="基准文件（默认 benchmarks/baseline.json，"
+                                           "指定 --database-url 时为 benchmarks/baseline-postgresql.json）")
+    parser.add_argument("--database-url", help="数据库相关的项在这个数据库（PostgreSQL）的副本上测量")
+    parser.add_argument("--retries", type=int, default=2, help="疑似耗时回归时重新测量的次数（排除偶发干扰）")
+    args = parser.parse_args()
+    if not args.baseline:
+        args.baseline = POSTGRES_BASELINE_PATH if args.database_url else BASELINE_PATH
+
+    # 微基准只测预处理，不加载真实的OCR模型；也保证离线可运行
+    install_stubs(ocr_latency=0, translation_latency=0)
+    names = [name for name in BENCHMARKS if not args.keyword or args.keyword in name]
+    if not names:
+        parser.error(f"没有匹配的项（可选: {', '.join(BENCHMARKS)}）")
+
+    baseline = {"results": {}}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    elif not args.update_baseline:
+        print(f"没有基准文件 {args.baseline}，只输出测量结果（用 --update-baseline 生成）")
+
+    fixtures = Fixtures(args.database_url)
+    try:
+        results, regressions = _run(names, fixtures, baseline, args)
+    finally:
+        fixtures.close()
+
+    if args.update_baseline:
+        merged = {name: r for name, r in baseline["results"].items() if name in BENCHMARKS}
+        merged.update(results)
+        baseline = {
+            "meta": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+            },
+            "results": {name: merged[name] for name in BENCHMARKS if name in merged},
+        }
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+        print(f"\n基准已更新: {args.baseline}")
+        return
+
+    if regressions:
+        print(f"\n{len(regressions)} 项超出容差: {', '.join(regressions)}")
+        sys.exit(1)
+    print("\n没有超出容差的回归")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+生成性能测试用的合成数据库
+
+数据由随机种子决定（时间戳以生成当天为基准），同一个数据库文件可以在不同提交之间反复使用，
+测试结果可以直接比较。
+默认规模：10万道题目、5万个词汇、500万条学习记录（时间分布在最近一年内）。
+除了SQLite文件，也可以生成到 --database-url 指定的数据库（例如本地PostgreSQL）中。
+
+用法：
+    python -m benchmarks.seed --output benchmarks/data/bench.db
+    python -m benchmarks.seed --scale 0.01          # 小规模，快速试跑
+    python -m benchmarks.seed --scale 0.01 --database-url postgresql+psycopg2://postgres@localhost/einbuergung_bench
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import bindparam, create_engine, text
+from sqlalchemy.engine import make_url
+
+from database import (Base, normalize_word, similarity_service, upgrade_schema, init_fulltext_search,
+                      init_change_tracking)
+
+DEFAULT_QUESTIONS = 100_000
+DEFAULT_VOCABULARY = 50_000
+DEFAULT_STUDY_RECORDS = 5_000_000
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# 用于拼出德语风格单词的音节
+_ONSETS = ["b", "d", "f", "g", "h", "k", "l", "m", "n", "p", "r", "s", "t", "w", "z",
+           "br", "fr", "gr", "kr", "pr", "tr", "st", "sch", "sp", "bl", "fl", "gl", "pl", "kl"]
+_VOWELS = ["a", "e", "i", "o", "u", "ä", "ö", "ü", "ei", "au", "ie", "eu"]
+_CODAS = ["", "n", "r", "s", "t", "l", "ch", "ng", "nd", "rt", "st", "cht", "ß", "ck", "tz"]
+_SUFFIXES = ["", "", "ung", "heit", "keit", "schaft", "en", "er", "lich", "isch"]
+_FUNCTION_WORDS = ["der", "die", "das", "in", "von", "mit", "für", "ist", "wird", "nicht", "eine", "auf", "zu"]
+_QUESTION_WORDS = ["Was", "Wer", "Wie", "Wann", "Welche", "Warum", "Wo"]
+_CATEGORIES = ["Politik", "Geschichte", "Gesellschaft", "Recht", "Kultur", "Bundesland"]
+_DIFFICULTIES = ["easy", "medium", "hard"]
+_LEVELS = ["A1", "A2", "B1", "B2", "C1"]
+_PARTS_OF_SPEECH = ["Nomen", "Verb", "Adjektiv", "Adverb"]
+_REVIEW_INTERVALS = [1, 3, 7, 14, 30, 90]
+
+def _ts(value: datetime) -> str:
+    """与SQLAlchemy在SQLite中保存DateTime的格式一致，保证字符串比较正确"""
+    return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+def is_url(target: str) -> bool:
+    return "://" in target
+
+class _SQLiteWriter:
+    """原生 sqlite3 executemany 批量写入（比经过SQLAlchemy快得多）"""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode = OFF")
+        self.conn.execute("PRAGMA synchronous = OFF")
+
+    @staticmethod
+    def value(v):
+        """时间和日期按SQLAlchemy的SQLite格式写成字符串"""
+        return _ts(v) if isinstance(v, datetime) else v.isoformat()
+
+    def insert(self, table: str, columns: list, rows):
+        self.conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows)
+
+    def update(self, table: str, columns: list, key: str, rows):
+        """rows 为 (columns 的值..., key 的值) 元组"""
+        self.conn.executemany(
+            f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in columns)} WHERE {key} = ?", rows)
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+class _EngineWriter:
+    """通过SQLAlchemy Core批量写入其他数据库（PostgreSQL 上使用多行VALUES批量插入）"""
+
+    def __init__(self, engine):
+        self.conn = engine.connect()
+
+    @staticmethod
+    def value(v):
+        return v
+
+    def insert(self, table: str, columns: list, rows):
+        self.conn.execute(Base.metadata.tables[table].insert(), [dict(zip(columns, row)) for row in rows])
+
+    def update(self, table: str, columns: list, key: str, rows):
+        t = Base.metadata.tables[table]
+        stmt = t.update().where(t.c[key] == bindparam("_key")).values({c: bindparam(f"_{c}") for c in columns})
+        self.conn.execute(stmt, [dict(zip([f"_{c}" for c in columns] + ["_key"], row)) for row in rows])
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        # 显式指定了id的表需要把序列推进到最大id之后，否则应用新建记录时主键冲突
+        if self.conn.dialect.name == "postgresql":
+            for table in ("questions", "vocabulary", "study_records"):
+                self.conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"))
+            self.conn.commit()
+        self.conn.close()
+
+def _make_word(rng: random.Random) -> str:
+    syllables = "".join(rng.choice(_ONSETS) + rng.choice(_VOWELS) + rng.choice(_CODAS)
+                        for _ in range(rng.randint(1, 3)))
+    return (syllables + rng.choice(_SUFFIXES)).capitalize()
+
+def make_words(count: int, seed: int) -> list:
+    """生成 count 个规范化后互不相同的单词"""
+    rng = random.Random(seed)
+    words, keys = [], set()
+    while len(words) < count:
+        word = _make_word(rng)
+        key = normalize_word(word)
+        if key not in keys:
+            keys.add(key)
+            words.append(word)
+    return words
+
+def _make_sentence(rng: random.Random, words: list, length: int) -> str:
+    tokens = [rng.choice(_QUESTION_WORDS)]
+    for _ in range(length):
+        tokens.append(rng.choice(_FUNCTION_WORDS) if rng.random() < 0.35 else rng.choice(words))
+    return " ".join(tokens) + "?"
+
+def seed_database(target: str, questions: int = DEFAULT_QUESTIONS, vocabulary: int = DEFAULT_VOCABULARY,
+                  study_records: int = DEFAULT_STUDY_RECORDS, seed: int = 42, batch_size: int = 50_000):
+    """
+    生成合成数据库
+
+    target 是SQLite文件路径或数据库URL（已有的表会被删除重建）。
+    先建表并批量写入（此时还没有全文索引和变更计数触发器），
+    LSH桶和统计汇总表在生成过程中直接算好，最后再建全文索引和触发器。
+    """
+    if is_url(target):
+        engine = create_engine(target)
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        writer = _EngineWriter(engine)
+    else:
+        if os.path.exists(target):
+            os.remove(target)
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        engine = create_engine(f"sqlite:///{target}")
+        Base.metadata.create_all(bind=engine)
+        engine.dispose()
+        writer = _SQLiteWriter(target)
+    ts = writer.value
+
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    start = now - timedelta(days=365)
+
+    started = time.perf_counter()
+    words = make_words(vocabulary, seed)
+    writer.insert(
+        "vocabulary",
+        ["id", "german_word", "lookup_key", "chinese_translation", "part_of_speech", "difficulty",
+         "example_sentence", "created_at", "review_count"],
+        [
+            (i, word, normalize_word(word), f"词{i}", rng.choice(_PARTS_OF_SPEECH), rng.choice(_LEVELS),
+             _make_sentence(rng, words, rng.randint(4, 8)), ts(start), 0)
+            for i, word in enumerate(words, start=1)
+        ]
+    )
+    writer.commit()
+    print(f"词汇: {vocabulary} 条 ({time.perf_counter() - started:.1f}s)")
+
+    started = time.perf_counter()
+    for offset in range(0, questions, batch_size):
+        rows, buckets = [], []
+        for question_id in range(offset + 1, min(offset + batch_size, questions) + 1):
+            german_text = _make_sentence(rng, words, rng.randint(6, 14))
+            options = "\n".join(f"{label}. {_make_sentence(rng, words, 3)}" for label in "ABCD")
+            rows.append((question_id, german_text, f"问题{question_id}", rng.choice(_CATEGORIES),
+                         rng.choice(_DIFFICULTIES), options, rng.choice("ABCD"), None, ts(start), ts(start)))
+            buckets.extend((question_id, band, bucket)
+                           for band, bucket in enumerate(similarity_service.band_buckets(german_text)))
+        writer.insert("questions", ["id", "german_text", "chinese_translation", "category", "difficulty", "options",
+                                    "correct_answer", "explanation", "created_at", "updated_at"], rows)
+        writer.insert("question_lsh_buckets", ["question_id", "band", "bucket"], buckets)
+        writer.commit()
+    print(f"题目: {questions} 条 ({time.perf_counter() - started:.1f}s)")
+
+    # 学习记录按时间顺序生成，同时累加每日和每个条目的统计（连续答对次数需要按时间顺序计算）
+    started = time.perf_counter()
+    # 泊松过程：间隔服从指数分布，时间天然有序，不需要先生成再排序
+    rate = study_records / (now - start).total_seconds()
+    elapsed = 0.0
+    daily, items = {}, {}
+    for batch_start in range(0, study_records, batch_size):
+        rows = []
+        for record_id in range(batch_start + 1, min(batch_start + batch_size, study_records) + 1):
+            elapsed += rng.expovariate(rate)
+            review_date = min(start + timedelta(seconds=elapsed), now)
+            # 80% 是词汇复习，少数条目被复习得更多（平方分布）
+            if rng.random() < 0.8:
+                key = ("vocabulary", int(vocabulary * rng.random() ** 2) + 1)
+            else:
+                key = ("question", int(questions * rng.random() ** 2) + 1)
+            is_correct = rng.random() < 0.7
+            rows.append((record_id, key[1] if key[0] == "question" else None,
+                         key[1] if key[0] == "vocabulary" else None, is_correct, ts(review_date)))
+
+            day = daily.setdefault(review_date.date(), [0, 0])
+            day[0] += 1
+            day[1] += is_correct
+            item = items.setdefault(key, [0, 0, 0, None])
+            item[0] += 1
+            item[1] += is_correct
+            item[2] = item[2] + 1 if is_correct else 0
+            item[3] = review_date
+        writer.insert("study_records", ["id", "question_id", "vocabulary_id", "is_correct", "review_date"], rows)
+        writer.commit()
+    writer.insert("daily_stats", ["day", "reviews", "correct"],
+                  [(ts(day), reviews, correct) for day, (reviews, correct) in daily.items()])
+    writer.insert(
+        "item_stats", ["item_type", "item_id", "reviews", "correct", "streak", "last_reviewed"],
+        [(item_type, item_id, reviews, correct, streak, ts(last))
+         for (item_type, item_id), (reviews, correct, streak, last) in items.items()]
+    )
+    writer.update(
+        "vocabulary", ["review_count", "last_reviewed", "next_review"], "id",
+        [
+            (reviews, ts(last), ts(last + timedelta(days=_REVIEW_INTERVALS[min(streak, len(_REVIEW_INTERVALS) - 1)])),
+             item_id)
+            for (item_type, item_id), (reviews, correct, streak, last) in items.items()
+            if item_type == "vocabulary"
+        ]
+    )
+    writer.commit()
+    writer.close()
+    print(f"学习记录: {study_records} 条 ({time.perf_counter() - started:.1f}s)")
+
+    # 全文索引、变更计数触发器；upgrade_schema 此时没有需要回填的内容
+    started = time.perf_counter()
+    if not is_url(target):
+        engine = create_engine(f"sqlite:///{target}")
+    upgrade_schema(engine)
+    init_fulltext_search(engine)
+    init_change_tracking(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+        if is_url(target):
+            # 记录生成参数，ensure_database 据此判断能否复用
+            conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS benchmark_dataset (questions INTEGER, vocabulary INTEGER, "
+                                 "study_records INTEGER, seed INTEGER)")
+            conn.exec_driver_sql("DELETE FROM benchmark_dataset")
+            conn.execute(text("INSERT INTO benchmark_dataset VALUES (:questions, :vocabulary, :study_records, :seed)"),
+                         {"questions": questions, "vocabulary": vocabulary, "study_records": study_records,
+                          "seed": seed})
+    engine.dispose()
+    print(f"索引: ({time.perf_counter() - started:.1f}s)")
+    return target
+
+def default_path(scale: float, seed: int = 42) -> str:
+    """按规模和种子命名的缓存文件路径"""
+    return os.path.join(DATA_DIR, f"bench-scale{scale:g}-seed{seed}.db")
+
+def _scaled(scale: float) -> dict:
+    return {"questions": max(1, int(DEFAULT_QUESTIONS * scale)),
+            "vocabulary": max(1, int(DEFAULT_VOCABULARY * scale)),
+            "study_records": max(1, int(DEFAULT_STUDY_RECORDS * scale))}
+
+def _seeded_with(url: str):
+    """数据库URL中已有合成数据的生成参数，没有时返回 None"""
+    engine = create_engine(url)
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(text("SELECT questions, vocabulary, study_records, seed FROM benchmark_dataset")).first()
+    except Exception:
+        return None
+    finally:
+        engine.dispose()
+    return dict(row._mapping) if row else None
+
+def ensure_database(scale: float = 1.0, seed: int = 42, path: str = None, url: str = None) -> str:
+    """
+    返回合成数据库路径（指定 url 时返回 url），不存在时先生成
+
+    url 指向的数据库中已有同样规模和种子的数据时直接复用，否则清空重建。
+    """
+    params = _scaled(scale)
+    if url:
+        if _seeded_with(url) != {**params, "seed": seed}:
+            seed_database(url, seed=seed, **params)
+        return url
+    path = path or default_path(scale, seed)
+    if not os.path.exists(path):
+        seed_database(path, seed=seed, **params)
+    return path
+
+def copy_database(url: str, name: str) -> str:
+    """
+    从合成数据的PostgreSQL数据库复制出一个临时数据库（CREATE DATABASE ... TEMPLATE），返回其URL
+
+    写入类测试在副本上进行，不改动原数据；用完后调用 drop_database。
+    """
+    source = make_url(url)
+    if source.get_backend_name() != "postgresql":
+        raise ValueError(f"只支持复制 PostgreSQL 数据库: {source.get_backend_name()}")
+    admin = create_engine(source.set(database="postgres"), isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        conn.exec_driver_sql(f'DROP DATABASE IF EXISTS "{name}"')
+        conn.exec_driver_sql(f'CREATE DATABASE "{name}" TEMPLATE "{source.database}"')
+    admin.dispose()
+    return source.set(database=name).render_as_string(hide_password=False)
+
+def drop_database(url: str):
+    target = make_url(url)
+    admin = create_engine(target.set(database="postgres"), isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        conn.exec_driver_sql(f'DROP DATABASE IF EXISTS "{target.database}"')
+    admin.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description="生成性能测试用的合成数据库")
+    parser.add_argument("--output", help="输出文件（默认 benchmarks/data/bench-scale<规模>-seed<种子>.db）")
+    parser.add_argument("--database-url", help="生成到这个数据库中（例如PostgreSQL），而不是SQLite文件")
+    parser.add_argument("--scale", type=float, default=1.0, help="数据规模系数，1.0 为默认规模")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    target = args.database_url or args.output or default_path(args.scale, args.seed)
+    seed_database(target, seed=args.seed, **_scaled(args.scale))
+    print(f"已生成: {make_url(target).render_as_string() if is_url(target) else target}")
+
+if __name__ == "__main__":
+    main()
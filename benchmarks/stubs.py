@@ -0,0 +1,45 @@
+"""
+OCR和翻译后端的替身
+
+负载测试关注的是本应用自身的开销，不应受外部翻译API限流或OCR模型加载的影响。
+替身模块在导入 app 之前放入 sys.modules，用固定延迟模拟真实后端的耗时。
+"""
+import sys
+import time
+import types
+
+OCR_LINES = [
+    "In Deutschland dürfen Menschen offen etwas gegen die Regierung sagen, weil hier Religionsfreiheit gilt.",
+    "Die Bundesregierung und der Bundestag werden in freien und geheimen Wahlen bestimmt.",
+]
+
+def install_stubs(ocr_latency: float = 0.2, translation_latency: float = 0.05):
+    """用替身替换 easyocr 和 googletrans（必须在导入 app 之前调用）"""
+    easyocr = types.ModuleType("easyocr")
+
+    class Reader:
+        def __init__(self, languages, gpu=False, **kwargs):
+            pass
+
+        def readtext(self, image, **kwargs):
+            time.sleep(ocr_latency)
+            return [([[0, 0], [1, 0], [1, 1], [0, 1]], line, 0.9) for line in OCR_LINES]
+
+    easyocr.Reader = Reader
+
+    googletrans = types.ModuleType("googletrans")
+
+    class Translator:
+        def translate(self, text, src="auto", dest="en"):
+            time.sleep(translation_latency)
+            if isinstance(text, list):
+                return [types.SimpleNamespace(text=f"[{dest}] {t}") for t in text]
+            return types.SimpleNamespace(text=f"[{dest}] {text}")
+
+        def detect(self, text):
+            return types.SimpleNamespace(lang="de")
+
+    googletrans.Translator = Translator
+
+    sys.modules["easyocr"] = easyocr
+    sys.modules["googletrans"] = googletrans
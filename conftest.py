@@ -0,0 +1,24 @@
+"""
+pytest 的公共设置：接口测试使用临时数据库，OCR和翻译使用 benchmarks.stubs 中的离线替身
+
+database 模块在导入时按 DATABASE_URL 创建 engine，所以要在任何测试导入 app / database 之前设置。
+TEST_DATABASE_URL 可以指向一个空的 PostgreSQL 数据库，在 PostgreSQL 上运行同样的测试。
+"""
+import os
+import tempfile
+
+import pytest
+
+_tmpdir = tempfile.mkdtemp(prefix="einbuergung-test-")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite:///{_tmpdir}/test.db")
+
+from benchmarks.stubs import install_stubs
+
+install_stubs(ocr_latency=0, translation_latency=0)
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    import app
+    with TestClient(app.app) as test_client:
+        yield test_client
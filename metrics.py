@@ -0,0 +1,129 @@
+"""
+Prometheus 监控指标
+
+所有指标在这里集中定义，/metrics 接口以 Prometheus 文本格式输出。
+- 请求延迟按路由模板（如 /api/questions/{question_id}）统计，避免标签基数随ID增长
+- OCR、翻译、数据库查询等阶段的耗时统一记录在 stage_duration_seconds 中，按 stage 区分
+"""
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from sqlalchemy import event
+
+# 请求延迟分桶（秒）：覆盖从毫秒级的数据库查询到数秒的OCR识别
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP请求处理时间（到响应头发出为止）",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "正在处理的HTTP请求数", ["method"])
+
+STAGE_LATENCY = Histogram(
+    "stage_duration_seconds", "各处理阶段耗时（image_decode、ocr、translation、vocabulary_detection、db_query）",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+
+OCR_CALLS = Counter("ocr_calls_total", "OCR识别调用次数", ["outcome"])
+OCR_IN_PROGRESS = Gauge("ocr_in_progress", "正在进行的OCR识别数")
+UPLOADS_REJECTED = Counter("uploads_rejected_total", "被拒绝的图片上传次数", ["reason"])
+TRANSLATION_CALLS = Counter("translation_calls_total", "翻译调用次数", ["backend", "outcome"])
+CACHE_REQUESTS = Counter("cache_requests_total", "缓存查询次数", ["cache", "result"])
+
+DB_QUERIES = Counter("db_queries_total", "数据库查询次数", ["operation"])
+DB_POOL_CHECKED_OUT = Gauge("db_pool_connections_checked_out", "连接池中已借出的连接数")
+DB_POOL_SIZE = Gauge("db_pool_size", "连接池大小")
+REVIEW_QUEUE_DEPTH = Gauge("review_queue_depth", "等待批量写入的复习记录数")
+
+@contextmanager
+def track_stage(stage: str):
+    """记录一个处理阶段的耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(stage=stage).observe(time.perf_counter() - start)
+
+def record_cache(cache: str, hit: bool):
+    """记录一次缓存查询是否命中"""
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+def _statement_operation(statement: str) -> str:
+    """SQL语句类型（SELECT/INSERT/...），用作标签"""
+    words = statement.lstrip().split(None, 1)
+    operation = words[0].upper() if words else ""
+    return operation if operation in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH") else "OTHER"
+
+def instrument_engine(engine):
+    """统计数据库查询次数和耗时，并导出连接池使用情况"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        DB_QUERIES.labels(operation=_statement_operation(statement)).inc()
+        STAGE_LATENCY.labels(stage="db_query").observe(elapsed)
+
+    pool = engine.pool
+    if hasattr(pool, "checkedout"):
+        DB_POOL_CHECKED_OUT.set_function(pool.checkedout)
+    if hasattr(pool, "size"):
+        DB_POOL_SIZE.set_function(pool.size)
+
+def track_queue_depth(pending_count):
+    """导出复习写入缓冲的队列长度（pending_count 为无参函数）"""
+    REVIEW_QUEUE_DEPTH.set_function(pending_count)
+
+class MetricsMiddleware:
+    """
+    按路由模板统计请求延迟（ASGI中间件）
+
+    直接包装 send，不像 BaseHTTPMiddleware 那样把响应体改成分块流式发送，
+    外层 GZipMiddleware 的 minimum_size 仍然对小响应生效。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        start = time.perf_counter()
+        observed = False
+        REQUESTS_IN_PROGRESS.labels(method=method).inc()
+
+        def observe(status: int):
+            nonlocal observed
+            if observed:
+                return
+            observed = True
+            REQUESTS_IN_PROGRESS.labels(method=method).dec()
+            # 路由匹配后 scope 中才有 route
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                method=method,
+                route=route.path if route is not None else "unmatched",
+                status=str(status)
+            ).observe(time.perf_counter() - start)
+
+        async def send_with_metrics(message):
+            if message["type"] == "http.response.start":
+                observe(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            # 没有发出响应头就抛出异常时按500统计
+            observe(500)
+
+def render_metrics():
+    """返回 (指标文本, Content-Type)"""
+    return generate_latest(), CONTENT_TYPE_LATEST
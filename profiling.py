@@ -0,0 +1,189 @@
+"""
+SQL 性能分析（以及启动耗时分析）
+
+在 engine 上挂 SQLAlchemy 事件监听器，按请求统计查询次数和累计耗时：
+- 响应头 X-DB-Query-Count 和 Server-Timing（db;dur=毫秒）返回本次请求的统计，浏览器开发者工具可以直接看到；
+  会暴露内部查询信息，默认关闭，只在开发和排查性能问题时打开
+- 超过阈值的慢查询连同 EXPLAIN QUERY PLAN 输出写入日志
+- 同一条SQL在一个请求里重复执行多次（典型的 N+1，例如逐条访问 study_records 关系）时记录警告
+
+启动耗时：app 中的初始化步骤用 startup_step 计时；profile_startup 在子进程中用
+python -X importtime 导入 app，按顶层模块汇总导入耗时（python server.py --profile-startup）。
+
+环境变量：
+    SLOW_QUERY_MS        慢查询阈值（毫秒），默认 200
+    N_PLUS_ONE_THRESHOLD 同一条SELECT在一个请求中执行多少次视为 N+1，默认 10
+    SQL_DEBUG_HEADERS    设为 1 时返回调试响应头，默认不返回
+"""
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger("einbuergung.sql")
+
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_MS", "200")) / 1000
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+DEBUG_HEADERS = os.getenv("SQL_DEBUG_HEADERS", "0") == "1"
+
+class RequestQueryStats:
+    """一次请求内的查询统计"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def repeated_statements(self, threshold: int = None):
+        """重复执行次数达到阈值的SELECT语句 [(语句, 次数)]"""
+        threshold = threshold or N_PLUS_ONE_THRESHOLD
+        return [
+            (statement, times) for statement, times in self.statements.most_common()
+            if times >= threshold and statement.lstrip().upper().startswith("SELECT")
+        ]
+
+# 当前请求的统计；请求之外（启动、后台写入线程）的查询不计入
+_current_stats: ContextVar = ContextVar("sql_request_stats", default=None)
+
+def current_stats():
+    """当前请求的查询统计，不在请求中时返回 None"""
+    return _current_stats.get()
+
+def _explain(conn, statement, parameters):
+    """返回查询计划文本（失败时返回错误信息）"""
+    if conn.dialect.name == "sqlite":
+        explain = "EXPLAIN QUERY PLAN " + statement
+    else:
+        explain = "EXPLAIN " + statement
+    # 在同一个DBAPI连接上新开游标执行，避免打断原游标尚未读取的结果，也不会再次触发事件
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(explain, parameters)
+        return "\n".join(" | ".join(str(col) for col in row) for row in cursor.fetchall())
+    except Exception as e:
+        return f"(无法获取查询计划: {e})"
+    finally:
+        cursor.close()
+
+def install_profiling(engine):
+    """在 engine 上注册查询统计和慢查询日志"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("profiling_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["profiling_start"].pop()
+
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.duration += elapsed
+            stats.statements[statement] += 1
+
+        if elapsed >= SLOW_QUERY_SECONDS:
+            plan = "" if executemany else _explain(conn, statement, parameters)
+            logger.warning("慢查询 %.1fms: %s\n参数: %r\n查询计划:\n%s",
+                           elapsed * 1000, statement, parameters, plan)
+
+class ProfilingMiddleware:
+    """
+    为每个请求建立查询统计，并写入调试响应头（ASGI中间件）
+
+    与 MetricsMiddleware 一样直接包装 send，不改变响应体的发送方式。
+    响应头发出时写入截至当时的统计（普通响应此时已经执行完所有查询），请求结束后检查N+1。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats()
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and DEBUG_HEADERS:
+                headers = MutableHeaders(scope=message)
+                headers["X-DB-Query-Count"] = str(stats.count)
+                headers["Server-Timing"] = f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries"'
+            await send(message)
+
+        token = _current_stats.set(stats)
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current_stats.reset(token)
+
+        for statement, times in stats.repeated_statements():
+            logger.warning("疑似N+1查询: %s %s 中同一条SQL执行了 %d 次: %s",
+                           scope["method"], scope["path"], times, " ".join(statement.split()))
+
+# 启动阶段各初始化步骤的耗时 [(步骤, 秒)]
+_startup_steps = []
+
+@contextmanager
+def startup_step(name: str):
+    """记录一个启动初始化步骤的耗时"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _startup_steps.append((name, time.perf_counter() - started))
+
+def startup_steps():
+    return list(_startup_steps)
+
+def profile_startup(module: str = "app", limit: int = 20) -> dict:
+    """
+    在新的子进程中导入 module，统计启动耗时
+
+    用子进程是为了得到冷启动的数据（当前进程可能已经导入过这些模块）。
+    返回 total（秒）、modules（[(顶层模块, 自身导入耗时秒)]，按耗时降序，最多 limit 项）
+    和 steps（[(初始化步骤, 秒)]）。
+    """
+    code = (
+        "import json, time\n"
+        "started = time.perf_counter()\n"
+        f"import {module}\n"
+        "total = time.perf_counter() - started\n"
+        "import profiling\n"
+        "print(json.dumps({'total': total, 'steps': profiling.startup_steps()}))\n"
+    )
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+
+    # 每行格式：import time: 自身耗时[us] | 累计耗时[us] | 模块名（缩进表示被谁导入）
+    self_times = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        self_times[name.strip().split(".")[0]] += int(self_us)
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    modules = sorted(self_times.items(), key=lambda item: item[1], reverse=True)[:limit]
+    report["modules"] = [(name, us / 1e6) for name, us in modules]
+    return report
+
+def print_startup_report(module: str = "app", limit: int = 20):
+    report = profile_startup(module, limit)
+    print(f"冷启动导入 {module}: {report['total'] * 1000:.0f}ms")
+    print("\n按顶层模块的导入耗时（不含子进程启动）:")
+    for name, seconds in report["modules"]:
+        print(f"  {name:<28}{seconds * 1000:8.1f}ms")
+    print(f"\n{module} 的初始化步骤（已计入上面 {module} 的耗时）:")
+    for name, seconds in report["steps"]:
+        print(f"  {name:<28}{seconds * 1000:8.1f}ms")
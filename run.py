@@ -3,6 +3,7 @@
 德国入籍考试学习助手启动脚本
 """
 
+import argparse
 import subprocess
 import sys
 import os
@@ -22,11 +23,14 @@ def install_requirements():
         print(f"❌ 依赖安装失败: {e}")
         return False
 
-def start_backend():
-    """启动后端服务"""
+def start_backend(workers: int = 1):
+    """启动后端服务（workers 大于1时用 server.py 启动多进程模式）"""
     print("正在启动后端服务...")
+    command = [sys.executable, "app.py"]
+    if workers > 1:
+        command = [sys.executable, "server.py", "--workers", str(workers)]
     try:
-        subprocess.run([sys.executable, "app.py"], check=True)
+        subprocess.run(command, check=True)
     except KeyboardInterrupt:
         print("\n后端服务已停止")
     except Exception as e:
@@ -53,6 +57,10 @@ def open_browser():
         print(f"无法自动打开浏览器: {e}")
 
 def main():
+    parser = argparse.ArgumentParser(description="德国入籍考试学习助手启动脚本")
+    parser.add_argument("--workers", type=int, default=1, help="后端worker进程数（大于1时为多进程生产模式）")
+    args = parser.parse_args()
+
     print("🇩🇪 德国入籍考试学习助手")
     print("=" * 50)
     
@@ -72,7 +80,7 @@ def main():
     print("-" * 50)
     
     # 启动后端线程
-    backend_thread = Thread(target=start_backend, daemon=True)
+    backend_thread = Thread(target=start_backend, args=(args.workers,), daemon=True)
     backend_thread.start()
     
     # 启动浏览器线程
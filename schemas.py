@@ -1,6 +1,6 @@
 from pydantic import BaseModel
-from typing import Optional
-from datetime import datetime
+from typing import Optional, List
+from datetime import datetime, date
 
 # 题目相关模型
 class QuestionBase(BaseModel):
@@ -24,14 +24,28 @@ class QuestionUpdate(BaseModel):
     correct_answer: Optional[str] = None
     explanation: Optional[str] = None
 
+class QuestionChoice(BaseModel):
+    label: Optional[str] = None
+    text: str
+
 class Question(QuestionBase):
     id: int
+    choices: Optional[List[QuestionChoice]] = None
+    correct_option: Optional[int] = None
     created_at: datetime
     updated_at: datetime
 
     class Config:
         from_attributes = True
 
+class SimilarQuestion(BaseModel):
+    id: int
+    german_text: str
+    similarity: float
+
+class QuestionCreateResult(Question):
+    similar: List[SimilarQuestion] = []  # 题干相似的已有题目（提示，不阻止保存）
+
 # 词汇相关模型
 class VocabularyBase(BaseModel):
     german_word: str
@@ -63,6 +77,7 @@ class Vocabulary(VocabularyBase):
 # 学习记录模型
 class StudyRecord(BaseModel):
     id: int
+    user_id: Optional[int] = None
     question_id: Optional[int] = None
     vocabulary_id: Optional[int] = None
     is_correct: bool
@@ -88,17 +103,182 @@ class VocabularyStats(BaseModel):
     c1_words: int
     due_for_review: int
 
+class UserVocabularyStats(BaseModel):
+    user_id: int
+    total_vocabulary: int
+    reviewed_words: int
+    new_words: int
+    due_for_review: int
+    total_reviews: int
+    correct_reviews: int
+    accuracy: float
+
+# 仪表板模型
+class RecentQuestion(BaseModel):
+    id: int
+    german_text: str
+
+class Dashboard(BaseModel):
+    question_stats: QuestionStats
+    vocabulary_stats: VocabularyStats
+    recent_questions: List[RecentQuestion]
+    review_vocabulary: List[Vocabulary]
+
+# 学习分析模型
+class DailyStats(BaseModel):
+    day: date
+    reviews: int
+    correct: int
+    accuracy: float
+
+class ItemStats(BaseModel):
+    item_type: str
+    item_id: int
+    label: Optional[str] = None
+    reviews: int
+    correct: int
+    error_rate: float
+    streak: int
+    last_reviewed: Optional[datetime] = None
+
+class StudyStreak(BaseModel):
+    current_days: int
+    longest_days: int
+    last_study_day: Optional[date] = None
+
+class ForgettingCurvePoint(BaseModel):
+    elapsed_days: float
+    reviews: int
+    retention: float
+
+class ForgettingCurve(BaseModel):
+    stability_days: Optional[float] = None
+    points: List[ForgettingCurvePoint]
+
 # OCR和翻译模型
+class VocabularyWord(BaseModel):
+    word: str
+    difficulty: str
+    suggested_translation: str
+    vocabulary_id: Optional[int] = None
+    ocr_text: Optional[str] = None
+
 class OCRResult(BaseModel):
     german_text: str
     chinese_translation: str
-    vocabulary_words: list
+    vocabulary_words: List[VocabularyWord]
 
 class TranslationResult(BaseModel):
     original_text: str
     translated_text: str
 
-class VocabularyWord(BaseModel):
+class OCRPageIngest(BaseModel):
+    question: QuestionCreate
+    vocabulary: List[VocabularyCreate] = []
+    fill_translations: bool = True  # 缺少的中文翻译由服务端批量补全
+
+class OCRPageIngestResult(BaseModel):
+    question: Question
+    vocabulary: List[Vocabulary]
+    translated_count: int
+    similar: List[SimilarQuestion] = []  # 题干相似的已有题目（提示，不阻止保存）
+
+# 搜索和查重模型
+class QuestionSearchHit(BaseModel):
+    id: int
+    german_text: str
+    chinese_translation: Optional[str] = None
+    category: Optional[str] = None
+    snippet: str
+    rank: float
+
+class VocabularySearchHit(BaseModel):
+    id: int
+    german_word: str
+    chinese_translation: Optional[str] = None
+    difficulty: Optional[str] = None
+    snippet: str
+    rank: float
+
+class SearchResult(BaseModel):
+    query: str
+    questions: List[QuestionSearchHit]
+    vocabulary: List[VocabularySearchHit]
+
+class VocabularyMatch(BaseModel):
     word: str
-    difficulty: str
-    suggested_translation: str 
\ No newline at end of file
+    distance: int
+    source: str
+    vocabulary_id: Optional[int] = None
+
+class VocabularyLookupResult(BaseModel):
+    query: str
+    matches: List[VocabularyMatch]
+
+
+# 判分模型
+class AnswerSubmission(BaseModel):
+    question_id: int
+    option: Optional[int] = None  # 选项下标（choices 中的位置）
+    answer: Optional[str] = None  # 或者选项字母、选项文字
+
+class GradeRequest(BaseModel):
+    answers: List[AnswerSubmission]
+    record: bool = True  # 是否写入学习记录
+    user_id: Optional[int] = None  # 学习记录所属的用户
+
+class GradedAnswer(BaseModel):
+    question_id: int
+    option: Optional[int] = None
+    answer: Optional[str] = None
+    is_correct: Optional[bool] = None  # 题目不存在或没有正确答案时为空
+    correct_option: Optional[int] = None
+    correct_answer: Optional[str] = None
+
+class GradeResult(BaseModel):
+    total: int
+    correct: int
+    results: List[GradedAnswer]
+
+# 模拟考试模型
+class ExamQuestion(BaseModel):
+    id: int
+    german_text: str
+    chinese_translation: Optional[str] = None
+    category: Optional[str] = None
+    difficulty: Optional[str] = None
+    options: Optional[str] = None
+    choices: Optional[List[QuestionChoice]] = None
+
+class Exam(BaseModel):
+    seed: int
+    size: int
+    questions: List[ExamQuestion]
+
+class ExamSubmission(BaseModel):
+    answers: List[AnswerSubmission]
+    user_id: Optional[int] = None
+
+class ExamResult(BaseModel):
+    total: int
+    correct: int
+    score: float
+    passed: bool
+    results: List[GradedAnswer]
+
+class CacheStats(BaseModel):
+    size: int
+    maxsize: int
+    ttl_seconds: float
+    hits: int
+    shared_hits: int
+    misses: int
+    hit_ratio: Optional[float] = None
+
+# 通用响应
+class MessageResponse(BaseModel):
+    message: str
+
+class HealthStatus(BaseModel):
+    status: str
+    message: str 
\ No newline at end of file
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+生产模式：预先fork的多进程服务
+
+父进程先导入 app（建表、加载词汇索引）并预先加载EasyOCR模型，监听端口后fork出N个worker。
+模型权重在fork之后按写时复制共享，N个worker只占一份模型内存；所有worker在同一个
+监听socket上accept，由内核分配连接。父进程只负责监控，worker异常退出时重新fork。
+
+每个worker的torch/OpenCV/BLAS线程数限制为 CPU核数 / worker数，避免N个进程各自开满
+线程互相争抢CPU。SQLite的多进程写入设置（WAL、busy_timeout）见 database.py。
+
+注意：/metrics 的指标是每个worker各自统计的。
+
+用法：
+    python server.py --workers 4
+    python server.py --workers 4 --threads-per-worker 2 --port 8000
+    python server.py --profile-startup        # 输出各模块导入和初始化步骤的耗时后退出
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+def _thread_env(threads: int):
+    """在导入numpy/torch/cv2之前设置线程数，OpenMP和BLAS只在初始化时读取这些变量"""
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS"):
+        os.environ.setdefault(name, str(threads))
+
+def _limit_threads(threads: int):
+    """限制本进程中torch和OpenCV的线程数"""
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+    cv2 = sys.modules.get("cv2")
+    if cv2 is not None:
+        cv2.setNumThreads(threads)
+
+def _run_worker(app_module, sock, threads: int, log_level: str):
+    """fork之后在子进程中运行：重建不能跨进程共享的资源，然后开始服务"""
+    import uvicorn
+
+    # 不关闭父进程的连接（它们仍属于父进程），只丢弃连接池，让本进程重新建立连接
+    app_module.engine.dispose(close=False)
+    app_module.review_service.after_fork()
+    _limit_threads(threads)
+
+    config = uvicorn.Config(app_module.app, log_level=log_level, timeout_graceful_shutdown=10)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def serve(workers: int, host: str = "0.0.0.0", port: int = 8000, threads_per_worker: int = None,
+          log_level: str = "info"):
+    """以 workers 个预先fork的进程提供服务，阻塞直到收到 SIGINT/SIGTERM"""
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    _thread_env(threads)
+
+    started = time.perf_counter()
+    import app as app_module
+    # OCR模型默认在第一次识别时加载；这里在fork之前加载，所有worker共享同一份
+    app_module.ocr_service.load()
+    print(f"应用加载完成 ({time.perf_counter() - started:.1f}s)，启动 {workers} 个worker，每个 {threads} 个线程")
+
+    if workers <= 1 or not hasattr(os, "fork"):
+        # 单进程（Windows没有fork）
+        import uvicorn
+        _limit_threads(threads)
+        uvicorn.run(app_module.app, host=host, port=port, log_level=log_level)
+        return
+
+    sock = _bind(host, port)
+    # 把导入阶段产生的对象移出GC跟踪，避免子进程中的垃圾回收触碰这些页面而破坏写时复制
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 0
+            try:
+                _run_worker(app_module, sock, threads, log_level)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started_at = children.pop(pid, None)
+        if started_at is None or stopping:
+            continue
+        print(f"worker {pid} 退出（状态 {status}），重新启动")
+        # 启动后立刻崩溃的worker稍等再重启，避免忙循环
+        if time.monotonic() - started_at < 1:
+            time.sleep(1)
+        spawn()
+    sock.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程生产模式")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+                        help="worker进程数（默认 WEB_CONCURRENCY 或CPU核数）")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="每个worker的torch/OpenCV线程数（默认 CPU核数 / worker数）")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--profile-startup", action="store_true", help="输出各模块导入和初始化步骤的耗时后退出")
+    args = parser.parse_args()
+    if args.profile_startup:
+        import profiling
+        profiling.print_startup_report("app")
+        return
+    serve(args.workers, args.host, args.port, args.threads_per_worker, args.log_level)
+
+if __name__ == "__main__":
+    main()
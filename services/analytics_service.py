@@ -0,0 +1,109 @@
+import math
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import case, func, select
+
+from database import DailyStats, ItemStats, StudyRecord, Vocabulary, Question
+
+class AnalyticsService:
+    """
+    学习数据分析
+
+    日统计和单项统计直接读取汇总表（daily_stats / item_stats），
+    遗忘曲线等需要全部学习记录的分析在数据库中分组聚合，不把学习记录读入内存。
+    汇总表按UTC日期统计（与 apply_review_rollups 一致），"今天"也按UTC计算。
+    汇总表不区分用户，统计的是全部用户的复习；遗忘曲线按用户分别计算复习间隔后合并。
+    """
+
+    # 遗忘曲线按距上次复习的天数分组
+    INTERVAL_BINS = [0, 1, 2, 4, 8, 16, 32, 64, 128, float("inf")]
+    # 样本太少的分组不参与拟合，避免长间隔的零星记录主导结果
+    MIN_FIT_REVIEWS = 10
+
+    def daily_stats(self, db, days: int = 30) -> List[Dict]:
+        """最近 N 天每天的复习次数和正确率"""
+        since = datetime.utcnow().date() - timedelta(days=days - 1)
+        rows = db.query(DailyStats).filter(DailyStats.day >= since).order_by(DailyStats.day).all()
+        return [
+            {"day": row.day, "reviews": row.reviews, "correct": row.correct,
+             "accuracy": row.correct / row.reviews if row.reviews else 0.0}
+            for row in rows
+        ]
+
+    def item_stats(self, db, item_type: str = "vocabulary", min_reviews: int = 3, limit: int = 20) -> List[Dict]:
+        """错误率最高的题目或词汇（至少复习过 min_reviews 次），统计全部用户的复习"""
+        model, label_column = (Vocabulary, Vocabulary.german_word) if item_type == "vocabulary" \
+            else (Question, Question.german_text)
+        error_rate = 1.0 - ItemStats.correct * 1.0 / ItemStats.reviews
+        rows = db.query(ItemStats, label_column).outerjoin(model, model.id == ItemStats.item_id).filter(
+            ItemStats.item_type == item_type,
+            ItemStats.reviews >= min_reviews
+        ).order_by(error_rate.desc(), ItemStats.reviews.desc()).limit(limit).all()
+        return [
+            {"item_type": stats.item_type, "item_id": stats.item_id, "label": label,
+             "reviews": stats.reviews, "correct": stats.correct,
+             "error_rate": 1.0 - stats.correct / stats.reviews,
+             "streak": stats.streak, "last_reviewed": stats.last_reviewed}
+            for stats, label in rows
+        ]
+
+    def study_streak(self, db) -> Dict:
+        """连续学习天数：当前连续天数（今天或昨天仍在学习）和历史最长"""
+        days = [row[0] for row in db.query(DailyStats.day).filter(DailyStats.reviews > 0).order_by(DailyStats.day)]
+        longest = run = 0
+        previous = None
+        for day in days:
+            run = run + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+            longest = max(longest, run)
+            previous = day
+        today = datetime.utcnow().date()
+        current = run if previous is not None and today - previous <= timedelta(days=1) else 0
+        return {"current_days": current, "longest_days": longest, "last_study_day": previous}
+
+    def forgetting_curve(self, db) -> Dict:
+        """
+        根据词汇复习记录拟合遗忘曲线 R(t) = exp(-t / S)
+
+        对每条复习记录计算距同一用户上次复习同一词汇的天数（LAG 窗口函数，按 用户, 词汇 分区），
+        按天数分组求记忆保持率（答对比例），
+        再对 log(R) 做过原点的加权最小二乘得到记忆稳定度 S（天）。
+        分组统计在数据库中完成，只有每个分组的一行结果返回给应用。
+        """
+        previous = func.lag(StudyRecord.review_date).over(
+            partition_by=(StudyRecord.user_id, StudyRecord.vocabulary_id),
+            order_by=(StudyRecord.review_date, StudyRecord.id)
+        )
+        reviews = select(
+            StudyRecord.is_correct, StudyRecord.review_date, previous.label("previous")
+        ).where(StudyRecord.vocabulary_id.isnot(None)).subquery()
+
+        if db.bind.dialect.name == "postgresql":
+            elapsed = func.extract("epoch", reviews.c.review_date - reviews.c.previous) / 86400.0
+        else:
+            elapsed = func.julianday(reviews.c.review_date) - func.julianday(reviews.c.previous)
+        edges = self.INTERVAL_BINS[1:-1]
+        timed = select(
+            elapsed.label("elapsed_days"),
+            case((reviews.c.is_correct, 1.0), else_=0.0).label("correct"),
+        ).where(reviews.c.previous.isnot(None)).subquery()
+        binned = select(
+            timed.c.elapsed_days, timed.c.correct,
+            case(*[(timed.c.elapsed_days < edge, i) for i, edge in enumerate(edges)], else_=len(edges)).label("interval"),
+        ).subquery()
+        rows = db.execute(
+            select(func.avg(binned.c.elapsed_days), func.count(), func.avg(binned.c.correct))
+            .group_by(binned.c.interval).order_by(binned.c.interval)
+        ).all()
+        if not rows:
+            return {"stability_days": None, "points": []}
+
+        points = [{"elapsed_days": float(elapsed_days), "reviews": count, "retention": float(retention)}
+                  for elapsed_days, count, retention in rows]
+        fit = [p for p in points if p["retention"] > 0 and p["reviews"] >= self.MIN_FIT_REVIEWS]
+        denominator = sum(p["reviews"] * p["elapsed_days"] ** 2 for p in fit)
+        slope = sum(p["reviews"] * p["elapsed_days"] * math.log(p["retention"]) for p in fit) / denominator \
+            if denominator else 0.0
+        stability = -1.0 / slope if slope < 0 else None
+
+        return {"stability_days": stability, "points": points}
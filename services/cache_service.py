@@ -0,0 +1,198 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import metrics
+
+class LocalSharedCache:
+    """
+    共享缓存的本地替身
+
+    接口与 RedisSharedCache 相同（值为 bytes，带过期时间），数据保存在本进程内存中。
+    开发和测试时用它代替Redis，不需要单独启动缓存服务器。
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[1] <= time.monotonic():
+                del self._data[key]
+                return None
+            return item[0]
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+
+    def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+class RedisSharedCache:
+    """Redis共享缓存，多个worker进程或多台服务器共用；redis 包在第一次访问时才导入"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import redis
+                    self._client = redis.Redis.from_url(self.url)
+        return self._client
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(key, value, px=max(1, int(ttl * 1000)))
+
+    def delete(self, *keys: str):
+        if keys:
+            self.client.delete(*keys)
+
+def shared_cache_from_url(url: str):
+    """
+    按地址创建共享缓存：
+        空       不使用共享缓存
+        local    本进程内的替身（LocalSharedCache）
+        redis://host:6379/0、rediss://...、unix://...   Redis（需要安装 redis 包）
+    """
+    if not url:
+        return None
+    if url == "local":
+        return LocalSharedCache()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSharedCache(url)
+    raise ValueError(f"不支持的共享缓存地址: {url}")
+
+class ObjectCache:
+    """
+    单条记录的读穿透缓存：本进程内的 LRU + TTL，可选共享缓存作为第二层
+
+    get_or_load 先查本进程缓存，再查共享缓存，都未命中时调用 loader 读数据库并写入两层缓存；
+    loader 返回 None（记录不存在）时不缓存。修改记录的代码在提交之后调用 invalidate。
+
+    读取数据库期间如果有 invalidate，读到的可能是修改前的值，这次结果不写入缓存。
+    其他进程的修改只会删除共享缓存中的条目，本进程缓存中的旧值最多保留 ttl 秒。
+    传入 version（变更计数，须在调用 loader 之前读取）时，两层缓存都只使用同一版本下保存的值，
+    其他进程修改之后计数变化，这里会重新读取，返回的值不会比 version 对应的数据旧。
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60.0, shared=None,
+                 dumps: Callable = None, loads: Callable = None, prefix: str = "einbuergung:"):
+        if shared is not None and (dumps is None or loads is None):
+            raise ValueError("使用共享缓存时需要提供 dumps 和 loads")
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.shared = shared
+        self.dumps = dumps
+        self.loads = loads
+        self.prefix = f"{prefix}{name}:"
+        self._entries = OrderedDict()  # 键 -> (值, 过期时间, 版本)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._hits = self._shared_hits = self._misses = 0
+
+    def _shared_key(self, key) -> str:
+        return self.prefix + str(key)
+
+    def _shared_get(self, key, version):
+        # 共享缓存中的值前面带有写入时的版本（"版本|数据"），版本不同时按未命中处理
+        data = self.shared.get(self._shared_key(key))
+        if data is None:
+            return None
+        stored, _, payload = data.partition(b"|")
+        if version is not None and stored != str(version).encode():
+            return None
+        return self.loads(payload)
+
+    def _shared_set(self, key, value, version):
+        stored = b"" if version is None else str(version).encode()
+        self.shared.set(self._shared_key(key), stored + b"|" + self.dumps(value), self.ttl)
+
+    def get_or_load(self, key, loader: Callable, version: int = None):
+        if self.maxsize <= 0:
+            return loader()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now and (version is None or entry[2] == version):
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    metrics.record_cache(self.name, hit=True)
+                    return entry[0]
+                del self._entries[key]
+            generation = self._generation
+
+        if self.shared is not None:
+            value = self._shared_get(key, version)
+            if value is not None:
+                with self._lock:
+                    self._shared_hits += 1
+                    if self._generation == generation:
+                        self._store(key, value, now, version)
+                metrics.record_cache(self.name, hit=True)
+                return value
+
+        value = loader()
+        with self._lock:
+            self._misses += 1
+            fresh = self._generation == generation
+            if value is not None and fresh:
+                self._store(key, value, now, version)
+        metrics.record_cache(self.name, hit=False)
+        if value is not None and fresh and self.shared is not None:
+            self._shared_set(key, value, version)
+        return value
+
+    def _store(self, key, value, now: float, version: int = None):
+        self._entries[key] = (value, now + self.ttl, version)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        """删除若干条缓存（记录修改或删除之后调用）"""
+        if not keys:
+            return
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete(*[self._shared_key(key) for key in keys])
+
+    def clear(self):
+        """清空本进程缓存"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self._hits + self._shared_hits
+            total = hits + self._misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self._hits,
+                "shared_hits": self._shared_hits,
+                "misses": self._misses,
+                "hit_ratio": round(hits / total, 4) if total else None,
+            }
@@ -0,0 +1,108 @@
+import random
+import secrets
+import threading
+from array import array
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+
+from database import Question, get_table_versions
+
+class ExamService:
+    """
+    模拟考试：按类别分层随机抽题，批量判分
+
+    抽题不使用 ORDER BY RANDOM()（每次都要扫描并排序整张题目表），而是在内存中保存
+    每个类别的题目id数组，按各类别的题目数量比例分配题数后在数组中随机抽样。
+    id数组按题目表的变更计数（table_versions）判断是否过期，题目增删改后下一次抽题时重建。
+    只有填写了正确答案的题目才会被抽到。
+
+    指定 seed 时，在题库不变的前提下同样的 seed 和题数总是得到同一份试卷。
+    """
+
+    # 入籍考试：33题中答对17题及格
+    DEFAULT_SIZE = 33
+    PASS_RATIO = 17 / 33
+    MAX_SIZE = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._by_category = {}  # 类别 -> 题目id数组，键按类别名排序（未分类在最后）
+
+    def _refresh(self, db):
+        """题目表有变化时重建各类别的id数组"""
+        version = get_table_versions(db, ("questions",)).get("questions", 0)
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            rows = db.query(Question.category, Question.id).filter(
+                func.coalesce(Question.correct_answer, "") != ""
+            ).order_by(Question.id)
+            by_category = {}
+            for category, question_id in rows:
+                by_category.setdefault(category, array("l")).append(question_id)
+            self._by_category = dict(sorted(by_category.items(), key=lambda item: (item[0] is None, item[0] or "")))
+            self._version = version
+
+    @staticmethod
+    def _allocate(sizes: Dict, total: int) -> Dict:
+        """按各类别题目数量的比例分配题数（最大余数法），每类不超过该类的题目数"""
+        population = sum(sizes.values())
+        total = min(total, population)
+        quotas = {category: total * size / population for category, size in sizes.items()}
+        counts = {category: int(quota) for category, quota in quotas.items()}
+        remaining = total - sum(counts.values())
+        by_remainder = sorted(sizes, key=lambda category: quotas[category] - counts[category], reverse=True)
+        while remaining > 0:
+            for category in by_remainder:
+                if remaining and counts[category] < sizes[category]:
+                    counts[category] += 1
+                    remaining -= 1
+        return counts
+
+    def generate(self, db, size: int = DEFAULT_SIZE, seed: Optional[int] = None) -> Dict:
+        """生成一份试卷，返回 seed（用于复现）和不含答案的题目列表"""
+        self._refresh(db)
+        by_category = self._by_category
+        if seed is None:
+            seed = secrets.randbits(32)
+        rng = random.Random(seed)
+        size = max(1, min(size, self.MAX_SIZE))
+
+        counts = self._allocate({category: len(ids) for category, ids in by_category.items()}, size) \
+            if by_category else {}
+        question_ids = []
+        for category, ids in by_category.items():
+            question_ids.extend(rng.sample(ids, counts[category]))
+        rng.shuffle(question_ids)
+
+        rows = db.query(
+            Question.id, Question.german_text, Question.chinese_translation, Question.category,
+            Question.difficulty, Question.options, Question.choices
+        ).filter(Question.id.in_(question_ids)).all() if question_ids else []
+        by_id = {row.id: row._asdict() for row in rows}
+        # 抽样之后、查询之前被删除的题目直接跳过
+        questions = [by_id[question_id] for question_id in question_ids if question_id in by_id]
+        return {"seed": seed, "size": len(questions), "questions": questions}
+
+    def grade(self, db, answers: List[Dict], user_id: Optional[int] = None) -> Dict:
+        """
+        批量判分（见 Question.grade_answers）并写入学习记录；无法判分的题目按答错计算
+
+        Args:
+            answers: 字典列表，包含 question_id，以及 option（选项下标）或 answer（未作答时都为 None）
+            user_id: 学习记录所属的用户
+        """
+        results = Question.grade_answers(db, answers, user_id=user_id)
+        correct = sum(1 for result in results if result["is_correct"])
+        total = len(results)
+        return {
+            "total": total,
+            "correct": correct,
+            "score": correct / total if total else 0.0,
+            "passed": total > 0 and correct / total >= self.PASS_RATIO,
+            "results": results,
+        }
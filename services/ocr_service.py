@@ -1,49 +1,129 @@
-import easyocr
-import cv2
-import numpy as np
-from PIL import Image
-import os
+import threading
+
+import metrics
 
 class OCRService:
-    def __init__(self):
-        # 初始化EasyOCR，支持德语
-        self.reader = easyocr.Reader(['de'], gpu=False)
+    """
+    德语OCR识别
+
+    easyocr（连同torch）、OpenCV 和 numpy 在第一次识别时才导入，模型也在那时才加载；
+    只做增删改查的实例不需要承担这部分启动时间。多进程模式在fork之前调用 load() 预先加载。
+
+    上传的图片用 decode_image 在内存中解码，长边缩小到 max_side 像素以内再识别。
+    """
+    def __init__(self, max_side: int = 2560):
+        self.max_side = max_side
+        self._reader = None
+        self._lock = threading.Lock()
+    
+    @property
+    def reader(self):
+        if self._reader is None:
+            with self._lock:
+                if self._reader is None:
+                    # 初始化EasyOCR，支持德语
+                    import easyocr
+                    self._reader = easyocr.Reader(['de'], gpu=False)
+        return self._reader
     
-    def recognize_text(self, image_path: str) -> str:
+    def load(self):
+        """立即加载OCR模型"""
+        return self.reader
+    
+    def decode_image(self, data: bytes, image_format: str = None, width: int = 0, height: int = 0):
         """
-        识别图片中的德语文本
+        在内存中解码图片，长边超过 max_side 时缩小
+        
+        JPEG 按文件头中的尺寸选择 IMREAD_REDUCED_COLOR_2/4/8，由libjpeg在解码时直接按1/2、1/4、1/8
+        缩小，不需要先解码出全尺寸图像（缩小后长边不低于 max_side 的3/4）；其他格式解码后再缩小。
         
         Args:
-            image_path: 图片文件路径
+            data: 图片文件内容
+            image_format: 文件头中识别出的格式（见 services.upload_service.sniff_image）
+            width, height: 文件头中的尺寸
             
         Returns:
-            识别出的文本
+            BGR图像（numpy数组），无法解码时为 None
         """
-        try:
-            # 读取图片
-            image = cv2.imread(image_path)
+        import cv2
+        import numpy as np
+        
+        flags = cv2.IMREAD_COLOR
+        longest = max(width, height)
+        if image_format == "jpeg" and longest > self.max_side:
+            for factor, reduced in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                                    (2, cv2.IMREAD_REDUCED_COLOR_2)):
+                # 超过 max_side 的部分由 resize 完成
+                if longest // factor >= self.max_side * 3 // 4:
+                    flags = reduced
+                    break
+        with metrics.track_stage("image_decode"):
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), flags)
             if image is None:
-                raise ValueError("无法读取图片文件")
+                return None
+            image_height, image_width = image.shape[:2]
+            if max(image_width, image_height) > self.max_side:
+                scale = self.max_side / max(image_width, image_height)
+                size = (max(1, round(image_width * scale)), max(1, round(image_height * scale)))
+                image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return image
+    
+    def recognize_text(self, image) -> str:
+        """
+        识别图片中的德语文本
+        
+        Args:
+            image: 图片文件路径，或 decode_image 解码出的图像
             
-            # 图像预处理
-            image = self._preprocess_image(image)
+        Returns:
+            识别出的文本
+        """
+        return ' '.join(text for text, _ in self.recognize_lines(image)).strip()
+    
+    def recognize_lines(self, image) -> list:
+        """
+        按 reader.readtext 返回的顺序识别图片中的文本行
+        
+        Args:
+            image: 图片文件路径，或 decode_image 解码出的图像
             
-            # OCR识别
-            results = self.reader.readtext(image)
+        Returns:
+            [(文本, 置信度)] 列表，识别失败时为空列表
+        """
+        try:
+            with metrics.OCR_IN_PROGRESS.track_inprogress(), metrics.track_stage("ocr"):
+                import cv2
+                
+                # 读取图片
+                if isinstance(image, str):
+                    image = cv2.imread(image)
+                if image is None:
+                    raise ValueError("无法读取图片文件")
+                
+                # 图像预处理
+                image = self._preprocess_image(image)
+                
+                # OCR识别
+                results = self.reader.readtext(image)
             
             # 提取文本
-            text = ' '.join([result[1] for result in results])
+            lines = [(result[1].strip(), float(result[2])) for result in results if result[1].strip()]
+            metrics.OCR_CALLS.labels(outcome="success" if lines else "empty").inc()
             
-            return text.strip()
+            return lines
             
         except Exception as e:
             print(f"OCR识别错误: {e}")
-            return ""
+            metrics.OCR_CALLS.labels(outcome="error").inc()
+            return []
     
     def _preprocess_image(self, image):
         """
         图像预处理，提高OCR识别准确率
         """
+        import cv2
+        import numpy as np
+        
         # 转换为灰度图
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         
@@ -72,6 +152,8 @@ class OCRService:
             平均置信度
         """
         try:
+            import cv2
+            
             image = cv2.imread(image_path)
             if image is None:
                 return 0.0
@@ -0,0 +1,125 @@
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+from database import SessionLocal, Vocabulary
+
+class ReviewService:
+    """
+    词汇复习结果的批量写入缓冲
+
+    复习结果先进入内存队列，由后台线程按数量或时间触发批量写入：
+    一批复习只需一个事务（一次 fsync），并发复习时写入吞吐量大幅提高。
+
+    持久化模式（durability）：
+        sync  - 不缓冲，每条复习单独提交（原有行为）
+        group - 组提交：调用方等待所在批次提交后才返回，不会丢数据（默认）
+        async - 入队后立即返回，进程崩溃时最多丢失一个批次
+    """
+
+    DURABILITY_MODES = ("sync", "group", "async")
+
+    def __init__(self, session_factory=SessionLocal, durability: str = "group",
+                 max_batch: int = 500, max_delay: float = None):
+        if durability not in self.DURABILITY_MODES:
+            raise ValueError(f"未知的持久化模式: {durability}")
+        self.session_factory = session_factory
+        self.durability = durability
+        self.max_batch = max_batch
+        # 最早一条待写入记录最多等待的秒数；组提交模式下调用方在等待，所以默认很短
+        self.max_delay = max_delay if max_delay is not None else (0.005 if durability == "group" else 1.0)
+
+        self._start()
+
+    def _start(self):
+        self._pending = []  # (复习结果, Future)
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._thread = None
+        if self.durability != "sync":
+            self._thread = threading.Thread(target=self._run, name="review-writer", daemon=True)
+            self._thread.start()
+
+    def after_fork(self):
+        """在fork出的子进程中调用：后台线程不会随fork复制，重新创建锁和写入线程"""
+        self._start()
+
+    def record_review(self, vocabulary_id: int, is_correct: bool, user_id: int = None) -> Future:
+        """
+        提交一条复习结果（user_id 为 None 时更新词汇上的全局复习计划）
+
+        Returns:
+            写入完成后得到写入条数的 Future；async 模式下调用方可以不等待
+        """
+        review = {"vocabulary_id": vocabulary_id, "is_correct": is_correct, "review_date": datetime.utcnow(),
+                  "user_id": user_id}
+        future = Future()
+        if self._thread is None:
+            self._write([(review, future)])
+            return future
+
+        with self._wakeup:
+            if self._closed:
+                raise RuntimeError("复习写入缓冲已关闭")
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append((review, future))
+            if len(self._pending) >= self.max_batch or self.durability == "group":
+                self._wakeup.notify()
+        return future
+
+    def pending_count(self) -> int:
+        """队列中尚未写入的复习条数"""
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """立即写入队列中的全部复习结果"""
+        with self._wakeup:
+            batch, self._pending = self._pending, []
+        if batch:
+            self._write(batch)
+
+    def close(self):
+        """停止后台线程并写入剩余的复习结果（应用关闭时调用）"""
+        with self._wakeup:
+            self._closed = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                while not self._closed:
+                    if self._pending:
+                        remaining = self.max_delay - (time.monotonic() - self._oldest)
+                        if len(self._pending) >= self.max_batch or remaining <= 0:
+                            break
+                        self._wakeup.wait(remaining)
+                    else:
+                        self._wakeup.wait()
+                if self._closed:
+                    return
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+                self._oldest = time.monotonic() if self._pending else None
+            self._write(batch)
+
+    def _write(self, batch):
+        db = self.session_factory()
+        try:
+            written = Vocabulary.apply_reviews(db, [review for review, _ in batch])
+        except Exception as e:
+            db.rollback()
+            print(f"复习记录写入失败: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+        else:
+            for _, future in batch:
+                future.set_result(written)
+        finally:
+            db.close()
@@ -0,0 +1,74 @@
+import hashlib
+import random
+import re
+import unicodedata
+from typing import List, Set
+
+class SimilarityService:
+    """
+    基于 MinHash + LSH 的近似重复文本检测
+
+    文本先规范化（大小写折叠、去掉空白和标点），再切成字符 n-gram，
+    这样OCR常见的错字、漏空格（"gehörtzu"）只影响少数几个 shingle。
+    签名按 band 分组后哈希成桶号，Jaccard 相似度高的两段文本至少有一个 band 相同的概率很高，
+    因此查重只需按桶号做索引查找，不需要扫描全部题目。
+    """
+
+    # 2^61 - 1，梅森素数，用于构造哈希函数族 (a * x + b) mod p
+    _PRIME = (1 << 61) - 1
+
+    def __init__(self, num_bands: int = 16, rows_per_band: int = 4, shingle_size: int = 3, seed: int = 42):
+        self.num_bands = num_bands
+        self.rows_per_band = rows_per_band
+        self.shingle_size = shingle_size
+        rng = random.Random(seed)
+        self._hash_params = [
+            (rng.randrange(1, self._PRIME), rng.randrange(0, self._PRIME))
+            for _ in range(num_bands * rows_per_band)
+        ]
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """大小写折叠并去掉空白和标点"""
+        return re.sub(r"[\W_]+", "", unicodedata.normalize("NFC", text or "").casefold())
+
+    def shingles(self, text: str) -> Set[str]:
+        """字符 n-gram 集合"""
+        normalized = self.normalize(text)
+        if len(normalized) <= self.shingle_size:
+            return {normalized} if normalized else set()
+        return {normalized[i:i + self.shingle_size] for i in range(len(normalized) - self.shingle_size + 1)}
+
+    def signature(self, text: str) -> List[int]:
+        """MinHash 签名"""
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+            for s in self.shingles(text)
+        ]
+        if not hashes:
+            return []
+        prime = self._PRIME
+        return [min((a * h + b) % prime for h in hashes) for a, b in self._hash_params]
+
+    def band_buckets(self, text: str) -> List[int]:
+        """
+        LSH 桶号列表，第 i 个元素对应第 i 个 band
+
+        桶号是有符号 64 位整数，可以直接存入 SQLite/PostgreSQL 的 BIGINT 列。
+        """
+        signature = self.signature(text)
+        if not signature:
+            return []
+        buckets = []
+        for band in range(self.num_bands):
+            rows = signature[band * self.rows_per_band:(band + 1) * self.rows_per_band]
+            digest = hashlib.blake2b(",".join(map(str, rows)).encode("ascii"), digest_size=8).digest()
+            buckets.append(int.from_bytes(digest, "big", signed=True))
+        return buckets
+
+    def similarity(self, text_a: str, text_b: str) -> float:
+        """两段文本 shingle 集合的 Jaccard 相似度"""
+        a, b = self.shingles(text_a), self.shingles(text_b)
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
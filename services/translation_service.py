@@ -1,15 +1,34 @@
-from googletrans import Translator
-import requests
-import json
+import re
+import threading
 import time
 
+import metrics
+
 class TranslationService:
+    # 备用翻译返回的是带标记的原文，不是真正的翻译
+    FALLBACK_PREFIXES = ("[翻译] ", "[无法翻译] ")
+
     def __init__(self):
-        self.translator = Translator()
+        self._translator = None
+        self._lock = threading.Lock()
         self.fallback_api = "https://api.mymemory.translated.net/get"
         self.last_request_time = 0
         self.request_interval = 1  # 请求间隔，秒
     
+    @property
+    def translator(self):
+        """googletrans 在第一次翻译时才导入"""
+        if self._translator is None:
+            with self._lock:
+                if self._translator is None:
+                    from googletrans import Translator
+                    self._translator = Translator()
+        return self._translator
+    
+    @translator.setter
+    def translator(self, translator):
+        self._translator = translator
+    
     def translate(self, text: str, src_lang: str = 'de', dest_lang: str = 'zh-cn') -> str:
         """
         翻译文本
@@ -32,20 +51,34 @@ class TranslationService:
                 time.sleep(self.request_interval - (current_time - self.last_request_time))
             
             # 使用googletrans
-            translation = self.translator.translate(text, src=src_lang, dest=dest_lang)
+            with metrics.track_stage("translation"):
+                translation = self.translator.translate(text, src=src_lang, dest=dest_lang)
             self.last_request_time = time.time()
             
             if translation and hasattr(translation, 'text'):
+                metrics.TRANSLATION_CALLS.labels(backend="googletrans", outcome="success").inc()
                 return translation.text
             
             # 如果googletrans失败，尝试使用备用翻译方法
+            metrics.TRANSLATION_CALLS.labels(backend="googletrans", outcome="empty").inc()
             return self._fallback_translate(text, src_lang, dest_lang)
             
         except Exception as e:
             print(f"翻译错误: {e}")
+            metrics.TRANSLATION_CALLS.labels(backend="googletrans", outcome="error").inc()
             # 尝试备用翻译方法
             return self._fallback_translate(text, src_lang, dest_lang)
     
+    @classmethod
+    def is_fallback(cls, translation: str) -> bool:
+        """翻译结果是否为空或只是备用翻译的占位文本（不应作为翻译保存）"""
+        return not translation or translation.startswith(cls.FALLBACK_PREFIXES)
+    
+    @staticmethod
+    def split_sentences(text: str) -> list:
+        """按句末标点（. ! ? :）切分句子，用于逐句翻译"""
+        return [sentence for sentence in re.split(r'(?<=[.!?:])\s+', text.strip()) if sentence]
+    
     def _fallback_translate(self, text: str, src_lang: str = 'de', dest_lang: str = 'zh-cn') -> str:
         """
         备用翻译方法
@@ -55,29 +88,55 @@ class TranslationService:
         try:
             # 简单的模拟翻译，实际应用中可以使用其他翻译API
             # 这里只是为了演示，返回一个带标记的原文
+            metrics.TRANSLATION_CALLS.labels(backend="fallback", outcome="success").inc()
             return f"[翻译] {text}"
         except Exception as e:
             print(f"备用翻译错误: {e}")
+            metrics.TRANSLATION_CALLS.labels(backend="fallback", outcome="error").inc()
             return f"[无法翻译] {text}"
     
     def batch_translate(self, texts: list, src_lang: str = 'de', dest_lang: str = 'zh-cn') -> list:
         """
         批量翻译文本
         
+        全部文本（去重后）通过一次请求翻译，只受一次请求频率限制；
+        批量请求失败时再逐条翻译。
+        
         Args:
             texts: 要翻译的文本列表
             src_lang: 源语言代码
             dest_lang: 目标语言代码
             
         Returns:
-            翻译后的文本列表
+            翻译后的文本列表，与 texts 一一对应
         """
-        results = []
-        for text in texts:
-            results.append(self.translate(text, src_lang, dest_lang))
-            # 避免请求过于频繁
-            time.sleep(self.request_interval)
-        return results
+        unique = [text for text in dict.fromkeys(texts) if text]
+        if not unique:
+            return ["" for _ in texts]
+        
+        translated = {}
+        try:
+            # 限制请求频率
+            current_time = time.time()
+            if current_time - self.last_request_time < self.request_interval:
+                time.sleep(self.request_interval - (current_time - self.last_request_time))
+            
+            with metrics.track_stage("translation"):
+                translations = self.translator.translate(unique, src=src_lang, dest=dest_lang)
+            self.last_request_time = time.time()
+            
+            for text, translation in zip(unique, translations):
+                if translation and getattr(translation, 'text', None):
+                    translated[text] = translation.text
+            metrics.TRANSLATION_CALLS.labels(backend="googletrans_batch", outcome="success").inc()
+        except Exception as e:
+            print(f"批量翻译错误: {e}")
+            metrics.TRANSLATION_CALLS.labels(backend="googletrans_batch", outcome="error").inc()
+        
+        for text in unique:
+            if text not in translated:
+                translated[text] = self.translate(text, src_lang, dest_lang)
+        return [translated.get(text, "") for text in texts]
     
     def detect_language(self, text: str) -> str:
         """
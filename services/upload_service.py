@@ -0,0 +1,234 @@
+import struct
+from typing import NamedTuple, Optional
+
+import orjson
+
+import metrics
+
+class UploadError(Exception):
+    """上传被拒绝，status_code 为应返回的HTTP状态码"""
+
+    def __init__(self, status_code: int, detail: str, reason: str):
+        self.status_code = status_code
+        self.detail = detail
+        self.reason = reason
+        super().__init__(detail)
+
+class ImageUpload(NamedTuple):
+    data: bytes
+    format: str
+    width: int
+    height: int
+
+# 记录图片尺寸的SOF0~SOF15标记（C4=DHT、C8=JPG扩展、CC=DAC 不是SOF）
+_JPEG_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+def _sniff_jpeg(header: bytes):
+    """按段扫描到第一个SOF标记，读取图片尺寸；数据不够时返回 None"""
+    pos = 2
+    while True:
+        if pos >= len(header):
+            return None
+        if header[pos] != 0xFF:
+            raise UploadError(400, "JPEG文件已损坏", "corrupt")
+        # 标记前可以有任意个 0xFF 填充字节
+        while pos < len(header) and header[pos] == 0xFF:
+            pos += 1
+        if pos >= len(header):
+            return None
+        marker = header[pos]
+        pos += 1
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            continue
+        if marker in (0xD9, 0xDA):
+            # 图像数据之前没有SOF
+            raise UploadError(400, "JPEG文件已损坏", "corrupt")
+        if pos + 2 > len(header):
+            return None
+        length = struct.unpack(">H", header[pos:pos + 2])[0]
+        if marker in _JPEG_SOF:
+            if pos + 7 > len(header):
+                return None
+            height, width = struct.unpack(">HH", header[pos + 3:pos + 7])
+            return width, height
+        pos += length
+
+def _sniff_webp(header: bytes):
+    if len(header) < 30:
+        return None
+    chunk = header[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", header[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        bits = int.from_bytes(header[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        return int.from_bytes(header[24:27], "little") + 1, int.from_bytes(header[27:30], "little") + 1
+    raise UploadError(400, "WebP文件已损坏", "corrupt")
+
+def _sniff_bmp(header: bytes):
+    if len(header) < 26:
+        return None
+    dib_size = struct.unpack("<I", header[14:18])[0]
+    if dib_size == 12:
+        return struct.unpack("<HH", header[18:22])
+    width, height = struct.unpack("<ii", header[18:26])
+    # 高度为负表示自上而下存储
+    return abs(width), abs(height)
+
+def sniff_image(header: bytes) -> Optional[tuple]:
+    """
+    根据文件头判断图片格式并读取尺寸，不解码图像数据
+
+    Returns:
+        (格式, 宽, 高)；header 还不够长时返回 None
+    Raises:
+        UploadError: 不支持的格式（415）或文件头已损坏（400）
+    """
+    if len(header) < 12:
+        return None
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        if len(header) < 24:
+            return None
+        if header[12:16] != b"IHDR":
+            raise UploadError(400, "PNG文件已损坏", "corrupt")
+        width, height = struct.unpack(">II", header[16:24])
+        return "png", width, height
+    if header.startswith(b"\xff\xd8"):
+        size = _sniff_jpeg(header)
+        return ("jpeg", *size) if size else None
+    if header.startswith(b"RIFF") and header[8:12] == b"WEBP":
+        size = _sniff_webp(header)
+        return ("webp", *size) if size else None
+    if header.startswith(b"BM"):
+        size = _sniff_bmp(header)
+        return ("bmp", *size) if size else None
+    raise UploadError(415, "不支持的图片格式（支持PNG、JPEG、WebP、BMP）", "unsupported_format")
+
+class UploadService:
+    """
+    图片上传校验：边读边检查大小，并从文件头读取格式和尺寸
+
+    read_image 分块读取上传的文件，超过 max_bytes 立即拒绝；文件头读到后就判断格式和尺寸，
+    不支持的格式和像素数超过 max_pixels 的图片（解压炸弹）不会被完整读取，也不会进入OCR。
+    请求体本身的大小由 UploadLimitMiddleware 在解析multipart之前限制。
+    """
+
+    CHUNK_SIZE = 64 * 1024
+    # JPEG的EXIF段最长64KB，SOF标记一定在这个范围内
+    SNIFF_LIMIT = 256 * 1024
+    # multipart边界和各部分头部占用的空间
+    MULTIPART_OVERHEAD = 64 * 1024
+
+    def __init__(self, max_bytes: int = 10 * 1024 * 1024, max_pixels: int = 50_000_000):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+
+    def _reject(self, status_code: int, detail: str, reason: str):
+        metrics.UPLOADS_REJECTED.labels(reason=reason).inc()
+        raise UploadError(status_code, detail, reason)
+
+    def _check_header(self, header: bytes, complete: bool) -> Optional[tuple]:
+        try:
+            info = sniff_image(header)
+        except UploadError as e:
+            self._reject(e.status_code, e.detail, e.reason)
+        if info is None:
+            if complete or len(header) >= self.SNIFF_LIMIT:
+                self._reject(400, "无法读取图片尺寸，文件可能不完整", "corrupt")
+            return None
+        image_format, width, height = info
+        if width == 0 or height == 0:
+            self._reject(400, "图片尺寸无效", "corrupt")
+        if width * height > self.max_pixels:
+            self._reject(413, f"图片尺寸过大（{width}x{height}），最多 {self.max_pixels} 像素", "too_many_pixels")
+        return info
+
+    async def read_image(self, upload) -> ImageUpload:
+        """
+        分块读取上传的图片并校验
+
+        Args:
+            upload: FastAPI 的 UploadFile
+
+        Raises:
+            UploadError: 文件过大（413）、格式不支持（415）或无法读取尺寸（400）
+        """
+        chunks = []
+        size = 0
+        info = None
+        while True:
+            chunk = await upload.read(self.CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > self.max_bytes:
+                self._reject(413, f"文件过大，最大 {self.max_bytes / (1024 * 1024):.1f} MB", "too_large")
+            chunks.append(chunk)
+            if info is None:
+                info = self._check_header(b"".join(chunks)[:self.SNIFF_LIMIT], complete=False)
+        if info is None:
+            info = self._check_header(b"".join(chunks), complete=True)
+        return ImageUpload(b"".join(chunks), *info)
+
+class UploadLimitMiddleware:
+    """
+    限制上传接口的请求体大小（ASGI中间件）
+
+    Content-Length 超过 max_bytes 时不读取请求体，直接返回413；没有 Content-Length（分块传输）时
+    边接收边计数，超过后立即返回413。未超限的请求体交给应用正常解析。
+    只处理路径以 path_prefix 开头的POST请求。
+    """
+
+    def __init__(self, app, max_bytes: int, path_prefix: str = "/api/ocr/"):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_prefix = path_prefix
+
+    async def _reject(self, send):
+        metrics.UPLOADS_REJECTED.labels(reason="too_large").inc()
+        body = orjson.dumps({"detail": f"请求体过大，最大 {self.max_bytes / (1024 * 1024):.1f} MB"})
+        await send({"type": "http.response.start", "status": 413, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"connection", b"close"),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._reject(send)
+            return
+
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_bytes:
+                await self._reject(send)
+                return
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+
+        body_sent = False
+
+        async def replay():
+            # 先交出已接收的请求体，之后（如流式响应检测断开）再转给原来的 receive
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": b"".join(chunks), "more_body": False}
+            return await receive()
+
+        await self.app(scope, replay, send)
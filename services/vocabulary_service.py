@@ -1,12 +1,130 @@
 import re
 import json
 import os
-from typing import List, Dict
+import threading
+import time
+from typing import List, Dict, Optional
+
+class FuzzyWordIndex:
+    """
+    容错单词索引，用于匹配OCR产生的单字符错误（如 "Bundestaq" -> "Bundestag"）
+
+    支持编辑距离 ≤ 1（替换、插入、删除以及相邻字母换位）。
+    按鸽巢原理，把每个词按长度切成前后两半分别建索引：一次编辑只会落在其中一半，
+    所以匹配词的前半段一定是查询词的前缀，或后半段一定是查询词的后缀。
+    唯一的例外是跨越切分点的换位（"Bunedstag"），它同时改变两半，查询时把中间两个字母换回来直接查找。
+    查询时只需 7 次字典查找加少量候选校验，10万词量级下每次查询约几十微秒。
+    """
+
+    def __init__(self):
+        self._entries = {}  # 规范化单词 -> 附加信息
+        self._prefix = {}   # (长度, 前半段) -> 规范化单词集合
+        self._suffix = {}   # (长度, 后半段) -> 规范化单词集合
+
+    @staticmethod
+    def normalize(word: str) -> str:
+        return word.strip().casefold()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, word: str):
+        return self.normalize(word) in self._entries
+
+    def add(self, word: str, **info):
+        """添加单词，已存在时覆盖附加信息"""
+        key = self.normalize(word)
+        if not key:
+            return
+        self._entries[key] = {"word": word.strip(), **info}
+        half = len(key) // 2
+        self._prefix.setdefault((len(key), key[:half]), set()).add(key)
+        self._suffix.setdefault((len(key), key[half:]), set()).add(key)
+
+    def remove(self, word: str):
+        key = self.normalize(word)
+        if self._entries.pop(key, None) is None:
+            return
+        half = len(key) // 2
+        for buckets, bucket_key in ((self._prefix, (len(key), key[:half])),
+                                    (self._suffix, (len(key), key[half:]))):
+            bucket = buckets.get(bucket_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del buckets[bucket_key]
+
+    def get(self, word: str) -> Optional[Dict]:
+        return self._entries.get(self.normalize(word))
+
+    def lookup(self, word: str, limit: int = 5) -> List[Dict]:
+        """
+        查找与给定单词编辑距离 ≤ 1 的已知单词
+
+        Returns:
+            按距离排序的匹配列表，每项包含 word、distance 和添加时的附加信息
+        """
+        query = self.normalize(word)
+        if not query:
+            return []
+
+        candidates = set()
+        size = len(query)
+        for length in (size - 1, size, size + 1):
+            if length <= 0:
+                continue
+            half = length // 2
+            candidates.update(self._prefix.get((length, query[:half]), ()))
+            candidates.update(self._suffix.get((length, query[size - (length - half):]), ()))
+        half = size // 2
+        if half:
+            # 跨越前后两半切分点的相邻换位
+            swapped = query[:half - 1] + query[half] + query[half - 1] + query[half + 1:]
+            if swapped in self._entries:
+                candidates.add(swapped)
+
+        matches = []
+        for key in candidates:
+            if key == query:
+                matches.append((0, key))
+            elif self._within_one_edit(query, key):
+                matches.append((1, key))
+        matches.sort()
+        return [{**self._entries[key], "distance": distance} for distance, key in matches[:limit]]
+
+    @staticmethod
+    def _within_one_edit(a: str, b: str) -> bool:
+        if len(a) > len(b):
+            a, b = b, a
+        if len(b) - len(a) > 1:
+            return False
+        i = 0
+        while i < len(a) and a[i] == b[i]:
+            i += 1
+        if len(a) == len(b):
+            # 替换一个字母，或相邻两个字母换位
+            if a[i + 1:] == b[i + 1:]:
+                return True
+            return i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+        # 插入/删除一个字母
+        return a[i:] == b[i + 1:]
 
 class VocabularyService:
+    # 两次检查词汇库单词是否有变化的最短间隔（秒）
+    REFRESH_INTERVAL = 2.0
+
     def __init__(self):
         # B1词汇表（简化版本，实际应用中应该有完整的词汇表）
         self.b1_vocabulary = self._load_b1_vocabulary()
+
+        # 容错索引：B1基础词汇 + 词汇库中已保存的单词（由 add_known_word 和 refresh_known_words 维护）
+        self.word_index = FuzzyWordIndex()
+        for word in self.b1_vocabulary:
+            self.word_index.add(word, source="b1")
+        self._known = {}  # 索引中的词汇库单词：规范化单词 -> 词汇id
+        self._known_version = None
+        self._next_refresh = 0.0
+        self._lock = threading.Lock()
         
         # 高级词汇特征
         self.advanced_patterns = [
@@ -37,6 +155,72 @@ class VocabularyService:
             'ihrer', 'ihres', 'ihr', 'ihre', 'ihrer', 'ihres'
         }
         return basic_words
+
+    def add_known_word(self, word: str, vocabulary_id: int = None):
+        """把词汇库中的单词加入容错索引"""
+        with self._lock:
+            self._add_known_word(word, vocabulary_id)
+
+    def remove_known_word(self, word: str):
+        """从容错索引中移除词汇库单词（B1基础词汇保留）"""
+        with self._lock:
+            self._remove_known_word(word)
+
+    def _add_known_word(self, word: str, vocabulary_id: int = None):
+        self.word_index.add(word, source="vocabulary", vocabulary_id=vocabulary_id)
+        self._known[FuzzyWordIndex.normalize(word)] = vocabulary_id
+
+    def _remove_known_word(self, word: str):
+        self._known.pop(FuzzyWordIndex.normalize(word), None)
+        if word.casefold() in self.b1_vocabulary:
+            self.word_index.add(word.casefold(), source="b1")
+        else:
+            self.word_index.remove(word)
+
+    def refresh_due(self) -> bool:
+        """距上次检查已超过 REFRESH_INTERVAL 秒时返回 True，并把下一次检查推后（并发调用只有一个得到 True）"""
+        now = time.monotonic()
+        if now < self._next_refresh:
+            return False
+        self._next_refresh = now + self.REFRESH_INTERVAL
+        return True
+
+    def refresh_known_words(self, db, force: bool = False):
+        """
+        按 table_versions 中 vocabulary_words 的计数同步索引中的词汇库单词
+
+        多进程部署时每个worker各有一份索引：本进程的增删改由 add_known_word / remove_known_word 立即生效，
+        其他worker的修改要等计数变化后的下一次同步（调用方按 refresh_due 最多每 REFRESH_INTERVAL 秒同步一次）。
+        同步时读取全部 (id, 单词) 与索引比较，只增删有变化的单词；复习不改变这个计数，不会引起同步。
+        """
+        from database import Vocabulary, get_table_versions
+
+        # 先读计数再读单词：读单词期间提交的修改会让计数再次变化，下一次同步时补上
+        version = get_table_versions(db, ("vocabulary_words",)).get("vocabulary_words", 0)
+        if version == self._known_version and not force:
+            return
+        rows = db.query(Vocabulary.id, Vocabulary.german_word).all()
+        with self._lock:
+            current = {FuzzyWordIndex.normalize(word): (word, vocabulary_id) for vocabulary_id, word in rows}
+            for key in [key for key in self._known if key not in current]:
+                self._remove_known_word(key)
+            for key, (word, vocabulary_id) in current.items():
+                if self._known.get(key, -1) != vocabulary_id:
+                    self._add_known_word(word, vocabulary_id)
+            self._known_version = version
+
+    def lookup_word(self, word: str, limit: int = 5) -> List[Dict]:
+        """
+        容错查找已知单词
+
+        Args:
+            word: 待查找的单词（可能含有OCR错误）
+            limit: 最多返回的匹配数
+
+        Returns:
+            匹配列表，包含 word、distance、source（b1 或 vocabulary）
+        """
+        return self.word_index.lookup(word, limit=limit)
     
     def detect_advanced_vocabulary(self, text: str) -> List[Dict]:
         """
@@ -61,14 +245,29 @@ class VocabularyService:
             # 跳过B1基础词汇
             if word_lower in self.b1_vocabulary:
                 continue
+
+            # 容错匹配：OCR识别错误的B1词汇直接跳过，已知词汇纠正为词汇库中的写法
+            matches = self.word_index.lookup(word, limit=1)
+            match = matches[0] if matches else None
+            if match and match['source'] == 'b1':
+                continue
+            
+            ocr_text = word
+            if match:
+                word = match['word']
             
             # 检查是否符合高级词汇特征
             if self._is_advanced_word(word):
-                advanced_words.append({
+                item = {
                     'word': word,
                     'difficulty': self._estimate_difficulty(word),
                     'suggested_translation': ''
-                })
+                }
+                if match:
+                    item['vocabulary_id'] = match.get('vocabulary_id')
+                    if match['distance']:
+                        item['ocr_text'] = ocr_text
+                advanced_words.append(item)
         
         return advanced_words
     
@@ -28,6 +28,24 @@ if 'show_save_question' not in st.session_state:
 if 'ocr_result' not in st.session_state:
     st.session_state.ocr_result = None
 
+@st.cache_resource
+def _etag_cache():
+    """按URL保存上次响应的ETag和数据，跨rerun复用"""
+    return {}
+
+def api_get(path):
+    """条件GET：数据未变化时服务器返回304，直接复用本地缓存的结果"""
+    url = f"{API_BASE_URL}{path}"
+    cache = _etag_cache()
+    headers = {"If-None-Match": cache[url][0]} if url in cache else {}
+    response = requests.get(url, headers=headers)
+    if response.status_code == 304 and url in cache:
+        return cache[url][1]
+    data = response.json()
+    if response.status_code == 200 and "ETag" in response.headers:
+        cache[url] = (response.headers["ETag"], data)
+    return data
+
 def main():
     # 侧边栏导航
     st.sidebar.title("🇩🇪 入籍考试助手")
@@ -52,9 +70,10 @@ def show_dashboard():
     st.markdown("---")
     
     try:
-        # 获取统计数据
-        question_stats = requests.get(f"{API_BASE_URL}/api/questions/stats/summary").json()
-        vocabulary_stats = requests.get(f"{API_BASE_URL}/api/vocabulary/stats/summary").json()
+        # 统计、最近题目和待复习词汇一次获取
+        dashboard = api_get("/api/dashboard")
+        question_stats = dashboard["question_stats"]
+        vocabulary_stats = dashboard["vocabulary_stats"]
         
         # 统计卡片
         col1, col2, col3, col4 = st.columns(4)
@@ -109,7 +128,7 @@ def show_dashboard():
         
         with col1:
             st.subheader("最近添加的题目")
-            recent_questions = requests.get(f"{API_BASE_URL}/api/questions?limit=5").json()
+            recent_questions = dashboard["recent_questions"]
             if recent_questions:
                 for q in recent_questions:
                     st.write(f"• {q['german_text'][:50]}...")
@@ -118,7 +137,7 @@ def show_dashboard():
         
         with col2:
             st.subheader("待复习词汇")
-            review_vocab = requests.get(f"{API_BASE_URL}/api/vocabulary/review?limit=5").json()
+            review_vocab = dashboard["review_vocabulary"]
             if review_vocab:
                 for v in review_vocab:
                     st.write(f"• {v['german_word']} ({v['difficulty']})")
@@ -144,7 +163,7 @@ def show_questions():
     st.subheader("题目列表")
     
     try:
-        questions = requests.get(f"{API_BASE_URL}/api/questions").json()
+        questions = api_get("/api/questions?fields=german_text,category,difficulty,created_at")
         
         if questions:
             # 创建DataFrame
@@ -204,6 +223,9 @@ def show_add_question_form():
                     st.success("题目添加成功！")
                     st.session_state.show_add_question = False
                     st.rerun()
+                elif response.status_code == 409:
+                    similar = response.json()['detail']['similar'][0]
+                    st.warning(f"题库中已有相同题目（ID {similar['id']}）：{similar['german_text'][:50]}...")
                 else:
                     st.error("添加失败")
             except Exception as e:
@@ -212,7 +234,7 @@ def show_add_question_form():
 def show_question_detail(question_id):
     """显示题目详情"""
     try:
-        question = requests.get(f"{API_BASE_URL}/api/questions/{question_id}").json()
+        question = api_get(f"/api/questions/{question_id}")
         
         st.subheader("题目详情")
         st.write(f"**德语文本:** {question['german_text']}")
@@ -250,7 +272,7 @@ def show_vocabulary():
     st.subheader("词汇列表")
     
     try:
-        vocabulary = requests.get(f"{API_BASE_URL}/api/vocabulary").json()
+        vocabulary = api_get("/api/vocabulary?fields=german_word,chinese_translation,difficulty,review_count,created_at")
         
         if vocabulary:
             df = pd.DataFrame(vocabulary)
@@ -307,7 +329,7 @@ def show_add_vocabulary_form():
 def start_vocabulary_review():
     """开始词汇复习"""
     try:
-        review_words = requests.get(f"{API_BASE_URL}/api/vocabulary/review").json()
+        review_words = api_get("/api/vocabulary/review")
         
         if not review_words:
             st.info("没有需要复习的词汇")
@@ -348,6 +370,64 @@ def record_review(vocabulary_id, is_correct):
         st.error(f"记录复习失败: {e}")
         return False
 
+def iter_sse(response):
+    """逐条解析 Server-Sent Events 响应，产生 (事件名, 数据)"""
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+def run_streaming_ocr(uploaded_file):
+    """调用流式识别接口，边接收边显示识别行、逐句翻译和高级词汇；返回完整结果（失败时为 None）"""
+    status = st.empty()
+    status.info("正在识别图片中的文本...")
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("德语文本")
+        lines_box = st.empty()
+    with col2:
+        st.subheader("中文翻译")
+        translation_box = st.empty()
+    vocabulary_box = st.empty()
+
+    lines, translations = [], []
+    files = {"image": (uploaded_file.name, uploaded_file.getvalue())}
+    with requests.post(f"{API_BASE_URL}/api/ocr/process-image/stream", files=files, stream=True) as response:
+        if response.status_code != 200:
+            # 上传被拒绝（过大、格式不支持等）时显示服务端给出的原因
+            try:
+                detail = response.json().get('detail', response.status_code)
+            except ValueError:
+                detail = response.status_code
+            status.error(f"识别失败: {detail}")
+            return None
+        for event, data in iter_sse(response):
+            if event == "line":
+                lines.append(data['text'])
+                lines_box.write("\n\n".join(lines))
+                status.info("正在翻译...")
+            elif event == "translation":
+                translations.append(data['chinese_translation'])
+                translation_box.write("\n\n".join(translations))
+            elif event == "vocabulary":
+                words = data['vocabulary_words']
+                if words:
+                    vocabulary_box.write("**检测到的高级词汇：** " +
+                                         "，".join(f"{word['word']} ({word['difficulty']})" for word in words))
+            elif event == "error":
+                status.error(f"识别失败: {data['detail']}")
+                return None
+            elif event == "done":
+                status.empty()
+                return data
+    return None
+
 def show_ocr():
     """显示图片识别"""
     st.title("🖼️ 图片识别")
@@ -357,8 +437,8 @@ def show_ocr():
     
     uploaded_file = st.file_uploader(
         "选择图片文件",
-        type=['png', 'jpg', 'jpeg', 'gif'],
-        help="支持PNG、JPG、JPEG、GIF格式"
+        type=['png', 'jpg', 'jpeg', 'webp', 'bmp'],
+        help="支持PNG、JPG、JPEG、WebP、BMP格式，最大10MB"
     )
     
     if uploaded_file is not None:
@@ -397,17 +477,14 @@ def show_ocr():
 
             # 始终提供重新识别按钮，便于用户在同一图片上重新识别
             if st.button("🔍 重新识别", key="re_ocr_btn"):
-                with st.spinner("正在重新识别图片中的文本..."):
-                    try:
-                        files = {"image": uploaded_file}
-                        response = requests.post(f"{API_BASE_URL}/api/ocr/process-image", files=files)
-                        if response.status_code == 200:
-                            new_result = response.json()
-                            st.session_state.ocr_result = new_result
-                            st.session_state.show_save_question = False
-                            st.experimental_rerun()
-                    except Exception as e:
-                        st.error(f"识别失败: {e}")
+                try:
+                    new_result = run_streaming_ocr(uploaded_file)
+                    if new_result:
+                        st.session_state.ocr_result = new_result
+                        st.session_state.show_save_question = False
+                        st.experimental_rerun()
+                except Exception as e:
+                    st.error(f"识别失败: {e}")
 
             # 如果尚未打开保存表单，则显示保存按钮
             if not st.session_state.get('show_save_question'):
@@ -417,20 +494,16 @@ def show_ocr():
         else:
             # 还没有识别结果，显示识别按钮
             if st.button("🔍 开始识别"):
-                with st.spinner("正在识别图片中的文本..."):
-                    try:
-                        # 发送图片到API
-                        files = {"image": uploaded_file}
-                        response = requests.post(f"{API_BASE_URL}/api/ocr/process-image", files=files)
-
-                        if response.status_code == 200:
-                            result = response.json()
+                try:
+                    # 流式接口：识别出的文本和翻译边到边显示
+                    result = run_streaming_ocr(uploaded_file)
 
-                            # 保存结果到会话状态并重新运行，以便显示结果
-                            st.session_state.ocr_result = result
-                            st.experimental_rerun()
-                    except Exception as e:
-                        st.error(f"识别失败: {e}")
+                    if result:
+                        # 保存结果到会话状态并重新运行，以便显示结果
+                        st.session_state.ocr_result = result
+                        st.experimental_rerun()
+                except Exception as e:
+                    st.error(f"识别失败: {e}")
     
     # 保存题目表单
     if st.session_state.get('show_save_question', False):
@@ -464,8 +537,8 @@ def show_save_ocr_question():
         
         if submitted:
             try:
-                # 1. 保存题目
-                data = {
+                # 题目和检测到的词汇一次请求、一个事务保存；缺少的翻译由服务端批量补全
+                question_data = {
                     "german_text": german_text,
                     "chinese_translation": chinese_translation,
                     "category": category,
@@ -474,45 +547,36 @@ def show_save_ocr_question():
                     "correct_answer": correct_answer,
                     "explanation": explanation
                 }
+                vocab_data = [
+                    {
+                        "german_word": word_info['word'],
+                        "chinese_translation": word_info.get('suggested_translation', ''),
+                        "difficulty": word_info['difficulty'],
+                        "part_of_speech": "未知"
+                    }
+                    for word_info in result.get('vocabulary_words', [])
+                ] if save_vocabulary else []
+                data = {"question": question_data, "vocabulary": vocab_data}
                 
                 st.write(f"调试信息 - 发送数据: {data}")
                 
-                response = requests.post(f"{API_BASE_URL}/api/questions", json=data)
+                response = requests.post(f"{API_BASE_URL}/api/ingest/ocr-page", json=data)
                 st.write(f"调试信息 - 响应状态码: {response.status_code}")
-                st.write(f"调试信息 - 响应内容: {response.text}")
                 
                 if response.status_code == 200:
+                    saved = response.json()
                     st.success("题目保存成功！")
-                    
-                    # 2. 如果选择了保存词汇，则保存检测到的词汇
-                    if save_vocabulary and result.get('vocabulary_words'):
-                        saved_vocab_count = 0
-                        for word_info in result.get('vocabulary_words', []):
-                            try:
-                                # 检查词汇是否已存在
-                                vocab_data = {
-                                    "german_word": word_info['word'],
-                                    "chinese_translation": word_info.get('suggested_translation', ''),
-                                    "difficulty": word_info['difficulty'],
-                                    "part_of_speech": "未知"
-                                }
-                                
-                                st.write(f"调试信息 - 保存词汇: {vocab_data}")
-                                
-                                # 发送请求保存词汇
-                                vocab_response = requests.post(f"{API_BASE_URL}/api/vocabulary", json=vocab_data)
-                                st.write(f"调试信息 - 词汇响应: {vocab_response.status_code}")
-                                
-                                if vocab_response.status_code == 200:
-                                    saved_vocab_count += 1
-                            except Exception as e:
-                                st.error(f"保存词汇失败: {e}")
-                                print(f"保存词汇失败: {e}")
-                        
-                        if saved_vocab_count > 0:
-                            st.success(f"成功保存 {saved_vocab_count} 个词汇到词汇库！")
+                    if saved['vocabulary']:
+                        st.success(f"成功保存 {len(saved['vocabulary'])} 个词汇到词汇库！")
+                    if saved['translated_count']:
+                        st.info(f"自动补全了 {saved['translated_count']} 条翻译")
+                    for similar in saved.get('similar', []):
+                        st.info(f"题库中有相似题目（ID {similar['id']}，相似度 {similar['similarity']:.0%}），请确认不是重复")
                     
                     # 表单内不能有带回调的普通按钮；保存成功后在表单之外提供"返回"按钮
+                elif response.status_code == 409:
+                    similar = response.json()['detail']['similar'][0]
+                    st.warning(f"题库中已有相同题目（ID {similar['id']}），未重复保存")
                 else:
                     st.error(f"保存失败: {response.status_code}")
                     st.error(response.text)
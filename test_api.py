@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+接口和写入路径的测试：用 TestClient 调用应用（临时数据库，见 conftest.py）
+"""
+from datetime import datetime, timedelta
+
+import orjson
+
+def _create_question(client, **fields):
+    response = client.post("/api/questions", json=fields)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_search_matches_chinese_substrings(client):
+    question = _create_question(client, german_text="Wer wählt den deutschen Bundeskanzler?",
+                                chinese_translation="谁选举德国总理？", explanation="联邦议院选举联邦总理")
+    vocabulary = client.post("/api/vocabulary", json={"german_word": "Bundeskanzlerin",
+                                                      "chinese_translation": "女联邦总理"}).json()
+    for query in ("总理", "德国总理", "选举德国总理"):
+        result = client.get("/api/search", params={"q": query}).json()
+        assert question["id"] in [hit["id"] for hit in result["questions"]], query
+        assert all("**" in hit["snippet"] for hit in result["questions"]), query
+    result = client.get("/api/search", params={"q": "总理", "scope": "vocabulary"}).json()
+    assert vocabulary["id"] in [hit["id"] for hit in result["vocabulary"]]
+    # 中文词和德语词同时出现时两者都要命中
+    assert question["id"] in [hit["id"] for hit in client.get("/api/search", params={"q": "Bundeskanzler 总理"}).json()["questions"]]
+    assert not client.get("/api/search", params={"q": "Bundeskanzler 首都"}).json()["questions"]
+    assert not client.get("/api/search", params={"q": "柏林首都"}).json()["questions"]
+
+def test_search_german_prefix_and_umlaut_spelling(client):
+    question = _create_question(client, german_text="Welche Rechte haben Bürger in Deutschland?",
+                                chinese_translation="公民在德国有哪些权利？")
+    for query in ("Buerger", "Bürg", "rechte deutsch"):
+        result = client.get("/api/search", params={"q": query, "scope": "questions"}).json()
+        assert question["id"] in [hit["id"] for hit in result["questions"]], query
+
+def test_vocabulary_upsert_merges_by_normalized_word(client):
+    first = client.post("/api/vocabulary", json={"german_word": "Grundgesetz", "chinese_translation": "基本法"}).json()
+    # 大小写和前后空格不同的同一个词：同一行，只补充提供的非空字段
+    second = client.post("/api/vocabulary", json={"german_word": " grundgesetz",
+                                                   "example_sentence": "Das Grundgesetz gilt seit 1949."}).json()
+    assert second["id"] == first["id"]
+    assert second["german_word"] == "Grundgesetz"
+    assert second["chinese_translation"] == "基本法"
+    assert second["example_sentence"] == "Das Grundgesetz gilt seit 1949."
+
+    batch = client.post("/api/vocabulary/batch", json=[
+        {"german_word": "GRUNDGESETZ", "chinese_translation": ""},
+        {"german_word": "Verfassung", "chinese_translation": "宪法"},
+        {"german_word": "verfassung", "part_of_speech": "Nomen"},
+    ])
+    assert batch.status_code == 200, batch.text
+    rows = {row["german_word"]: row for row in batch.json()}
+    assert rows["Grundgesetz"]["id"] == first["id"] and rows["Grundgesetz"]["chinese_translation"] == "基本法"
+    assert rows["Verfassung"]["chinese_translation"] == "宪法"
+    assert client.get(f"/api/vocabulary/{rows['Verfassung']['id']}").json()["part_of_speech"] == "Nomen"
+
+def test_similar_questions_are_saved_with_a_warning(client):
+    options = "A. ja\nB. nein"
+    first = _create_question(client, german_text="In Deutschland ist die Pressefreiheit ein Grundrecht.",
+                             options=options, correct_answer="A")
+    # 只差一个词的不同题目：保存成功，相似的已有题目作为提示返回
+    second = _create_question(client, german_text="In Deutschland ist die Pressefreiheit kein Grundrecht.",
+                              options=options, correct_answer="B")
+    assert second["id"] != first["id"]
+    assert [similar["id"] for similar in second["similar"]] == [first["id"]]
+    for text in ("Welches Wappen gehört zum Bundesland Berlin?", "Welches Wappen gehört zum Bundesland Bayern?"):
+        assert client.post("/api/questions", json={"german_text": text}).status_code == 200
+
+def test_identical_question_is_rejected(client):
+    fields = {"german_text": "Wie viele Bundesländer hat Deutschland?", "options": "A. 14\nB. 15\nC. 16",
+              "correct_answer": "C"}
+    first = _create_question(client, **fields)
+    assert first["similar"] == []
+    # 大小写、空白和标点不同仍算相同
+    response = client.post("/api/questions", json={**fields, "german_text": "wie viele Bundesländer hat  Deutschland"})
+    assert response.status_code == 409
+    assert response.json()["detail"]["similar"][0]["id"] == first["id"]
+    # 选项或答案不同的不算重复
+    assert client.post("/api/questions", json={**fields, "correct_answer": "B"}).status_code == 200
+    assert client.post("/api/questions", params={"allow_duplicate": True}, json=fields).status_code == 200
+
+def test_ingest_rejects_only_identical_pages(client):
+    page = {"question": {"german_text": "Was bedeutet die Abkürzung BRD?", "chinese_translation": "BRD是什么意思？"},
+            "vocabulary": [], "fill_translations": False}
+    assert client.post("/api/ingest/ocr-page", json=page).status_code == 200
+    assert client.post("/api/ingest/ocr-page", json=page).status_code == 409
+    similar_page = {**page, "question": {**page["question"], "german_text": "Was bedeutet die Abkürzung DDR?"}}
+    response = client.post("/api/ingest/ocr-page", json=similar_page)
+    assert response.status_code == 200 and response.json()["similar"]
+
+def test_ingest_keeps_translations_given_in_the_same_batch(client):
+    page = {"question": {"german_text": "Was steht im Grundgesetz über die Würde des Menschen?"},
+            "vocabulary": [{"german_word": "Grundgesetz", "chinese_translation": "基本法"},
+                           {"german_word": "grundgesetz"}, {"german_word": "Menschenwürde"}]}
+    result = client.post("/api/ingest/ocr-page", json=page).json()
+    translations = {item["german_word"]: item["chinese_translation"] for item in result["vocabulary"]}
+    assert translations == {"Grundgesetz": "基本法", "Menschenwürde": "[zh-cn] Menschenwürde"}
+    assert result["question"]["chinese_translation"] and result["translated_count"] == 2
+
+def test_ingest_does_not_store_fallback_translations(client, monkeypatch):
+    from app import translation_service
+
+    class FailingTranslator:
+        def translate(self, text, src="auto", dest="en"):
+            raise ConnectionError("offline")
+
+    monkeypatch.setattr(translation_service, "translator", FailingTranslator())
+    monkeypatch.setattr(translation_service, "request_interval", 0)
+    page = {"question": {"german_text": "Wie viele Bundesländer hat Deutschland heute?"},
+            "vocabulary": [{"german_word": "Bundesland"}]}
+    result = client.post("/api/ingest/ocr-page", json=page).json()
+    assert result["translated_count"] == 0
+    assert not result["question"]["chinese_translation"] and not result["vocabulary"][0]["chinese_translation"]
+
+def test_conditional_get_returns_304_until_the_data_changes(client):
+    question = _create_question(client, german_text="Wer ist das Staatsoberhaupt der Bundesrepublik?")
+    first = client.get("/api/questions", params={"limit": 5})
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.headers["cache-control"] == "no-cache"
+    not_modified = client.get("/api/questions", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304 and not_modified.headers["etag"] == etag and not not_modified.content
+    # 不同的查询参数是不同的资源
+    assert client.get("/api/questions", params={"limit": 6}, headers={"If-None-Match": etag}).status_code == 200
+
+    client.put(f"/api/questions/{question['id']}", json={"category": "Politik"})
+    changed = client.get("/api/questions", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+
+    item = client.get(f"/api/questions/{question['id']}")
+    assert client.get(f"/api/questions/{question['id']}", headers={"If-None-Match": item.headers["etag"]}).status_code == 304
+
+def test_export_streams_ndjson_and_csv(client):
+    import csv
+    import io
+
+    vocabulary = client.post("/api/vocabulary", json={"german_word": "Exportwort", "chinese_translation": "导出"}).json()
+    lines = client.get("/api/export/vocabulary").text.splitlines()
+    rows = [orjson.loads(line) for line in lines]
+    assert vocabulary["id"] in [row["id"] for row in rows]
+    assert [row["id"] for row in rows] == sorted(row["id"] for row in rows)
+
+    response = client.get("/api/export/vocabulary", params={"format": "csv", "since": vocabulary["created_at"]})
+    assert response.headers["content-type"].startswith("text/csv")
+    exported = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["german_word"] for row in exported] == ["Exportwort"]
+    assert exported[0]["chinese_translation"] == "导出"
+
+    assert client.get("/api/export/table_versions").status_code == 404
+    assert client.get("/api/export/vocabulary", params={"format": "xml"}).status_code == 400
+
+def test_grading_accepts_options_letters_and_text(client):
+    question = _create_question(client, german_text="Wer wählt in Deutschland den Bundespräsidenten?",
+                                options="A. das Volk\nB. die Bundesversammlung\nC. der Bundesrat",
+                                correct_answer="B")
+    assert question["choices"][1] == {"label": "B", "text": "die Bundesversammlung"}
+    assert question["correct_option"] == 1
+    answers = [{"question_id": question["id"], "option": 1}, {"question_id": question["id"], "answer": "b"},
+               {"question_id": question["id"], "answer": "Die Bundesversammlung."},
+               {"question_id": question["id"], "answer": "A"}, {"question_id": 999999, "option": 0}]
+    result = client.post("/api/questions/grade", json={"answers": answers, "record": False}).json()
+    assert [item["is_correct"] for item in result["results"]] == [True, True, True, False, None]
+    assert result["total"] == 5 and result["correct"] == 3
+    assert result["results"][3] == {"question_id": question["id"], "option": 0, "answer": "A", "is_correct": False,
+                                    "correct_option": 1, "correct_answer": "die Bundesversammlung"}
+
+def test_csv_export_writes_choices_as_json(client):
+    import csv
+    import io
+
+    question = _create_question(client, german_text="Wie heißt die Hauptstadt von Deutschland?",
+                                options="A. Bonn\nB. Berlin", correct_answer="Berlin")
+    response = client.get("/api/export/questions", params={"format": "csv", "since": question["created_at"]})
+    exported = list(csv.DictReader(io.StringIO(response.text)))
+    assert [orjson.loads(row["choices"]) for row in exported] == [question["choices"]]
+
+def test_reviews_update_the_schedule(client):
+    vocabulary = client.post("/api/vocabulary", json={"german_word": "Wiederholung"}).json()
+    for is_correct in (True, True, False, True):
+        assert client.post(f"/api/vocabulary/{vocabulary['id']}/review", params={"is_correct": is_correct}).status_code == 200
+    item = client.get(f"/api/vocabulary/{vocabulary['id']}").json()
+    assert item["review_count"] == 4
+    # 第4次复习答对：间隔为 REVIEW_INTERVALS[3] = 14 天
+    last, next_review = (datetime.fromisoformat(item[key]) for key in ("last_reviewed", "next_review"))
+    assert next_review - last == timedelta(days=14)
+    assert client.post("/api/vocabulary/999999/review", params={"is_correct": True}).status_code == 404
+
+def test_review_state_is_kept_per_user(client):
+    vocabulary = client.post("/api/vocabulary", json={"german_word": "Einbürgerungstest"}).json()
+    url = "/api/users/{}/vocabulary"
+    for is_correct in (True, False):
+        assert client.post(f"{url.format(4901)}/{vocabulary['id']}/review",
+                           params={"is_correct": is_correct}).status_code == 200
+    assert client.post(f"{url.format(4901)}/999999/review", params={"is_correct": True}).status_code == 404
+
+    # 答错后下次复习在1天后，对用户4901不再到期；从未复习过的用户4902仍然需要复习
+    due = lambda user_id: {item["id"]: item for item in
+                           client.get(f"{url.format(user_id)}/review", params={"limit": 1000}).json()}
+    assert vocabulary["id"] not in due(4901)
+    assert due(4902)[vocabulary["id"]]["review_count"] == 0
+
+    stats = client.get(f"{url.format(4901)}/stats/summary").json()
+    assert (stats["reviewed_words"], stats["total_reviews"], stats["correct_reviews"], stats["accuracy"]) == (1, 2, 1, 0.5)
+    assert client.get(f"{url.format(4902)}/stats/summary").json()["total_reviews"] == 0
+    # 用户的复习不改变全局的复习进度
+    assert client.get(f"/api/vocabulary/{vocabulary['id']}").json()["review_count"] == 0
+
+def test_reviews_do_not_evict_other_cached_vocabulary(client):
+    from database import vocabulary_cache
+
+    cached, reviewed = (client.post("/api/vocabulary", json={"german_word": word}).json()
+                        for word in ("Zwischenspeicher", "Abfrage"))
+    client.get(f"/api/vocabulary/{cached['id']}")
+    hits = vocabulary_cache.stats()["hits"]
+    assert client.post(f"/api/vocabulary/{reviewed['id']}/review", params={"is_correct": True}).status_code == 200
+    assert client.get(f"/api/vocabulary/{cached['id']}").status_code == 200
+    assert vocabulary_cache.stats()["hits"] == hits + 1
+    assert client.get(f"/api/vocabulary/{reviewed['id']}").json()["review_count"] == 1
+
+def test_review_service_writes_concurrent_reviews_in_batches(client):
+    from concurrent.futures import ThreadPoolExecutor
+    from database import SessionLocal, UserVocabularyState
+    from services.review_service import ReviewService
+
+    vocabulary = client.post("/api/vocabulary", json={"german_word": "Stapel"}).json()
+    service = ReviewService(durability="group", max_delay=0.05)
+    try:
+        with ThreadPoolExecutor(max_workers=20) as pool:
+            futures = list(pool.map(lambda i: service.record_review(vocabulary["id"], i % 2 == 0, user_id=i % 2 + 1),
+                                    range(40)))
+        written = [future.result(timeout=5) for future in futures]
+    finally:
+        service.close()
+    # 每个 Future 得到所在批次的写入条数：40条并发复习合并成了少数几个事务
+    assert max(written) > 1
+    with SessionLocal() as db:
+        states = {state.user_id: state for state in db.query(UserVocabularyState).filter(
+            UserVocabularyState.vocabulary_id == vocabulary["id"])}
+    assert (states[1].review_count, states[1].correct_count) == (20, 20)
+    assert (states[2].review_count, states[2].correct_count) == (20, 0)
+    assert states[2].next_review - states[2].last_reviewed == timedelta(days=1)
+
+    async_service = ReviewService(durability="async", max_delay=60)
+    async_service.record_review(vocabulary["id"], True)
+    assert async_service.pending_count() == 1
+    async_service.close()
+    assert async_service.pending_count() == 0
+    assert client.get(f"/api/vocabulary/{vocabulary['id']}").json()["review_count"] == 1
+
+def test_sql_debug_headers_are_opt_in(client, monkeypatch):
+    import profiling
+    response = client.get("/api/questions", params={"limit": 1})
+    assert "x-db-query-count" not in response.headers and "server-timing" not in response.headers
+    monkeypatch.setattr(profiling, "DEBUG_HEADERS", True)
+    response = client.get("/api/questions", params={"limit": 1})
+    assert int(response.headers["x-db-query-count"]) >= 1
+    assert response.headers["server-timing"].startswith("db;dur=")
+
+def test_process_image_rejects_unsupported_uploads_and_recognizes_images(client):
+    import io
+    from PIL import Image
+
+    response = client.post("/api/ocr/process-image", files={"image": ("a.gif", b"GIF89a" + b"\0" * 20, "image/gif")})
+    assert response.status_code == 415
+    png = io.BytesIO()
+    Image.new("RGB", (40, 20), "white").save(png, format="PNG")
+    response = client.post("/api/ocr/process-image", files={"image": ("page.png", png.getvalue(), "image/png")})
+    assert response.status_code == 200
+    result = response.json()
+    assert result["german_text"].startswith("In Deutschland") and result["chinese_translation"].startswith("[zh-cn]")
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+纯函数的单元测试（不需要启动服务）
+"""
+import struct
+
+import orjson
+import pytest
+
+from database import _token_variants, build_fts_query, match_choice, parse_choices
+from services.cache_service import LocalSharedCache, ObjectCache
+from services.upload_service import UploadError, sniff_image
+from services.vocabulary_service import FuzzyWordIndex
+
+WORDS = ["Bundestag", "Wahl", "Grundgesetz", "abcd", "ab", "Bürger"]
+
+@pytest.fixture(scope="module")
+def word_index():
+    index = FuzzyWordIndex()
+    for word in WORDS:
+        index.add(word)
+    return index
+
+@pytest.mark.parametrize("query, expected", [
+    ("Bundestag", "Bundestag"),   # 完全一致
+    ("bundestag", "Bundestag"),   # 大小写
+    ("Bundestaq", "Bundestag"),   # 替换
+    ("Bundestg", "Bundestag"),    # 删除
+    ("Bundesstag", "Bundestag"),  # 插入
+    ("uBndestag", "Bundestag"),   # 开头换位
+    ("Bunedstag", "Bundestag"),   # 跨越切分点的换位
+    ("Bundestga", "Bundestag"),   # 末尾换位
+    ("acbd", "abcd"),
+    ("ba", "ab"),
+    ("Wahk", "Wahl"),
+    ("Bügrer", "Bürger"),
+])
+def test_fuzzy_lookup_finds_word(word_index, query, expected):
+    assert expected in [match["word"] for match in word_index.lookup(query)]
+
+@pytest.mark.parametrize("query", ["Bundesrat", "Wxyz", "dcba", "", "Gesetz"])
+def test_fuzzy_lookup_rejects_distant_words(word_index, query):
+    assert all(match["distance"] <= 1 for match in word_index.lookup(query))
+    assert not [match for match in word_index.lookup(query) if match["word"] in ("Bundestag", "abcd")]
+
+def _one_edit_variants(word: str):
+    """word 的所有编辑距离为1的变体（替换、插入、删除、相邻换位）"""
+    letters = "aex"
+    for i in range(len(word) + 1):
+        for c in letters:
+            yield word[:i] + c + word[i:]
+        if i < len(word):
+            yield word[:i] + word[i + 1:]
+            for c in letters:
+                yield word[:i] + c + word[i + 1:]
+        if i + 1 < len(word):
+            yield word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+@pytest.mark.parametrize("word", ["abcd", "abcde", "Bundestag", "ab", "xyz"])
+def test_fuzzy_lookup_covers_every_single_edit(word):
+    index = FuzzyWordIndex()
+    index.add(word)
+    for variant in _one_edit_variants(word.casefold()):
+        if variant:
+            assert index.lookup(variant), variant
+
+@pytest.mark.parametrize("token, expected", [
+    ("wahl", ["wahl"]),
+    ("buerger", ["buerger", "bürger"]),
+    ("bürger", ["buerger", "bürger"]),
+    ("straße", ["strasse", "straße"]),
+    ("grösse", ["groesse", "groeße", "grösse", "größe"]),
+])
+def test_token_variants(token, expected):
+    assert _token_variants(token) == expected
+
+@pytest.mark.parametrize("query, dialect, expected", [
+    ("Wahl", "sqlite", '"wahl"*'),
+    ("Wahl Bürger", "sqlite", '"wahl"* AND ("buerger"* OR "bürger"*)'),
+    ("Wahl", "postgresql", "'wahl':*"),
+    ("总理", "sqlite", ""),                 # 中文词由 trigram 索引处理
+    ("DDR时期", "sqlite", '"ddr"*'),
+    ("?!", "sqlite", ""),
+])
+def test_build_fts_query(query, dialect, expected):
+    assert build_fts_query(query, dialect) == expected
+
+@pytest.mark.parametrize("options, correct_answer, choices, correct_option", [
+    (None, "A", None, None),
+    ("A. Berlin\nB. Bonn", "B", [{"label": "A", "text": "Berlin"}, {"label": "B", "text": "Bonn"}], 1),
+    ("a) Berlin\nb) Bonn", "Berlin", [{"label": "A", "text": "Berlin"}, {"label": "B", "text": "Bonn"}], 0),
+    ("A. Berlin\nB. Bonn", "b. bonn.", [{"label": "A", "text": "Berlin"}, {"label": "B", "text": "Bonn"}], 1),
+    ("Berlin\n\nMünchen", "münchen", [{"label": None, "text": "Berlin"}, {"label": None, "text": "München"}], 1),
+    ("A. Berlin", "Hamburg", [{"label": "A", "text": "Berlin"}], None),
+    ("A. Berlin", None, [{"label": "A", "text": "Berlin"}], None),
+])
+def test_parse_choices(options, correct_answer, choices, correct_option):
+    assert parse_choices(options, correct_answer) == (choices, correct_option)
+
+@pytest.mark.parametrize("answer, expected", [
+    ("c", 2),
+    ("  die   Bürger ", 2),  # 选项文字，忽略大小写和多余空白
+    ("C. Die Bürger.", 2),   # 整行
+    ("Der Bundestag", 1),
+    ("D", None),
+    ("Bürger", None),
+])
+def test_match_choice(answer, expected):
+    choices, _ = parse_choices("A. Der Bundesrat\nB. Der Bundestag\nC. Die Bürger")
+    assert match_choice(choices, answer) == expected
+
+def test_object_cache_shares_and_invalidates_entries():
+    shared = LocalSharedCache()
+    worker_a, worker_b, worker_c = (ObjectCache("test", shared=shared, dumps=orjson.dumps, loads=orjson.loads)
+                                    for _ in range(3))
+    loaded = []
+
+    def loader(value):
+        return lambda: loaded.append(value) or {"value": value}
+
+    assert worker_a.get_or_load(1, loader("a"), version=1) == {"value": "a"}
+    assert worker_b.get_or_load(1, loader("b"), version=1) == {"value": "a"}  # 共享缓存命中
+    assert worker_b.get_or_load(1, loader("b"), version=2) == {"value": "b"}  # 其他进程修改过
+    worker_a.invalidate(1)
+    assert worker_c.get_or_load(1, loader("c"), version=2) == {"value": "c"}
+    assert loaded == ["a", "b", "c"]
+
+def _png_header(width, height):
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", width, height) + b"\x08\x02\0\0\0"
+
+# 最小的JPEG文件头：SOI、带数据的APP0段、SOF0（高 600，宽 800）
+_JPEG = (b"\xff\xd8" + b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\0" + b"\0" * 9
+         + b"\xff\xc0" + struct.pack(">HBHH", 17, 8, 600, 800) + b"\0" * 10)
+
+@pytest.mark.parametrize("header, expected", [
+    (_png_header(800, 600), ("png", 800, 600)),
+    (_JPEG, ("jpeg", 800, 600)),
+    (_JPEG[:16], None),  # SOF还没读到
+    (b"RIFF\0\0\0\0WEBPVP8 " + b"\0" * 10 + struct.pack("<HH", 640, 480), ("webp", 640, 480)),
+    (b"RIFF\0\0\0\0WEBPVP8X" + b"\0" * 8 + (639).to_bytes(3, "little") + (479).to_bytes(3, "little"),
+     ("webp", 640, 480)),
+    (b"BM" + b"\0" * 12 + struct.pack("<Iii", 40, 300, -200), ("bmp", 300, 200)),
+    (b"\x89PNG", None),
+])
+def test_sniff_image(header, expected):
+    assert sniff_image(header) == expected
+
+@pytest.mark.parametrize("header, status_code", [
+    (b"GIF89a" + b"\0" * 20, 415),
+    (b"hello world, not an image", 415),
+    (b"\x89PNG\r\n\x1a\n" + b"\0" * 4 + b"IDAT" + b"\0" * 16, 400),
+    (b"\xff\xd8\xff\xda" + b"\0" * 20, 400),
+])
+def test_sniff_image_rejects(header, status_code):
+    with pytest.raises(UploadError) as error:
+        sniff_image(header)
+    assert error.value.status_code == status_code